@@ -13,8 +13,10 @@ if PROGRAM_NAME == None:
 FAULTY = bool(int(os.getenv("FAULTY", "0"))) if PROGRAM_NAME != "rul_turbofan" else False
 FAULTY_CLIENT = json.loads(os.getenv("FAULTY_CLIENT", "[]")) if FAULTY else []
 NOISE_AMPLITUDE = float(os.getenv("NOISE_AMPLITUDE", "0"))
+FAULT_MODEL = os.getenv("FAULT_MODEL", "gaussian")
 NCLIENTS = int(os.getenv("NCLIENTS", "1"))
 ENGINE = int(os.getenv("ENGINE", "0"))
+SERVER_ENGINE = os.getenv("SERVER_ENGINE", "threads")
 
 logging.basicConfig(
     format='%(asctime)s [%(levelname)s]:%(name)s:%(threadName)s: %(message)s',
@@ -38,13 +40,17 @@ frequency = model_config["dataset"]["frequency"]
 dir_frequency = f"frequency={frequency}/"
 dir_faulty_client = f"faulty_client={FAULTY_CLIENT}/" if FAULTY else ""
 dir_noise = f"noise_amplitude={NOISE_AMPLITUDE}/" if FAULTY else ""
+dir_fault_model = (
+    f"fault_model={FAULT_MODEL}/" if FAULTY and FAULT_MODEL != "gaussian" else ""
+)
 dir_engine = f"engine={ENGINE}" if PROGRAM_NAME == "rul_turbofan_isolated" else ""
 dir_program = f"program={PROGRAM_NAME}/"
 
 results_dir = os.path.join(home, "results")
 evaluation_directory = os.path.join(
     results_dir, runtime_config["evaluation_directory"],
-    dir_frequency + dir_faulty_client + dir_noise + dir_program + dir_engine
+    dir_frequency + dir_faulty_client + dir_noise + dir_fault_model
+    + dir_program + dir_engine
 )
 if not os.path.isdir(evaluation_directory): 
     os.makedirs(evaluation_directory)
@@ -0,0 +1,291 @@
+import collections
+import threading
+import torch
+
+from typing import (
+    Callable, Dict, Hashable, Iterable, Optional, OrderedDict, Sequence, Tuple
+)
+
+
+class AggregationException(Exception):
+    pass
+
+
+class FlatLayout:
+    """Layout of the floating point entries of a state_dict in one flat vector.
+
+    The parameters and the buffers are laid out in the order of the
+    state_dict, and the vector has the dtype that all of them promote to. The
+    other entries, e.g. `num_batches_tracked`, are not part of the vector.
+    Layouts hold no data, so the aggregations of a layout share it.
+    """
+
+    def __init__(self, state_dict: OrderedDict):
+        self.keys = list(state_dict)
+        self.flat_keys = [
+            key for key, tensor in state_dict.items() if tensor.is_floating_point()
+        ]
+        self.shapes = [state_dict[key].shape for key in self.flat_keys]
+        self.dtypes = [state_dict[key].dtype for key in self.flat_keys]
+        self.numels = [state_dict[key].numel() for key in self.flat_keys]
+        self.numel = sum(self.numels)
+        self.dtype = torch.get_default_dtype()
+        if len(self.dtypes) > 0:
+            self.dtype = self.dtypes[0]
+            for dtype in self.dtypes[1:]:
+                self.dtype = torch.promote_types(self.dtype, dtype)
+
+    def pack(self, state_dict: OrderedDict, out: torch.Tensor) -> torch.Tensor:
+        """Pack the floating point entries of `state_dict` into the vector
+        `out`."""
+
+        torch.cat(
+            [
+                state_dict[key].detach().reshape(-1).to(self.dtype)
+                for key in self.flat_keys
+            ],
+            out=out,
+        )
+        return out
+
+    def unpack(self, vector: torch.Tensor, others: OrderedDict) -> OrderedDict:
+        """State_dict with the floating point entries of `vector`, as views
+        where the dtypes allow it, and the other entries of `others`."""
+
+        flat = dict(zip(
+            self.flat_keys,
+            (
+                tensor.view(shape).to(dtype)
+                for tensor, shape, dtype
+                in zip(vector.split(self.numels), self.shapes, self.dtypes)
+            ),
+        ))
+        return collections.OrderedDict(
+            (key, flat[key] if key in flat else others[key])
+            for key in self.keys
+        )
+
+
+_layouts: Dict[Tuple, FlatLayout] = {}
+_layouts_lock = threading.Lock()
+
+def flat_layout(state_dict: OrderedDict) -> FlatLayout:
+    """Layout of `state_dict`, cached by its keys, shapes and dtypes."""
+
+    signature = tuple(
+        (key, tuple(tensor.shape), tensor.dtype)
+        for key, tensor in state_dict.items()
+    )
+    with _layouts_lock:
+        if signature not in _layouts:
+            _layouts[signature] = FlatLayout(state_dict)
+        return _layouts[signature]
+
+
+def weighted_average(
+    weighted_state_dicts: Iterable[Tuple[OrderedDict, float]]
+) -> OrderedDict:
+    """Weighted sum of state_dicts, as `utils.fed_avg` on a zeroed model.
+
+    The floating point entries of the N state_dicts are packed into the rows
+    of an (N, P) matrix, and summed with a single product with the vector of
+    weights. The other entries are those of the last state_dict.
+    """
+
+    weighted_state_dicts = list(weighted_state_dicts)
+    state_dicts: Sequence[OrderedDict] = [entry[0] for entry in weighted_state_dicts]
+    layout = flat_layout(state_dicts[0])
+    weights = torch.tensor(
+        [float(entry[1]) for entry in weighted_state_dicts], dtype=layout.dtype
+    )
+    matrix = torch.empty((len(state_dicts), layout.numel), dtype=layout.dtype)
+    for row, state_dict in zip(matrix, state_dicts):
+        layout.pack(state_dict, row)
+    return layout.unpack(weights @ matrix, state_dicts[-1])
+
+
+class FlatAggregation:
+    """Aggregation of the unit weights of the clients of a round.
+
+    The unit weights of every client are packed into a row of the (N, P)
+    matrix of the layout as soon as they are received, in the thread of the
+    client, such that the weighted sum at the end of the round is a single
+    matrix-vector product.
+
+    The matrix of the `previous` aggregation of the same owner, e.g. of the
+    last round of a server, is reused if it is large enough, as the page
+    faults of a fresh matrix cost more than packing the weights into it. The
+    previous aggregation is then no longer to be used.
+    """
+
+    def __init__(
+        self, state_dict: OrderedDict, rows: int,
+        previous: Optional["FlatAggregation"] = None,
+    ):
+        self.layout = flat_layout(state_dict)
+        if (
+            (previous != None) and (previous.layout is self.layout)
+            and (previous._storage.size()[0] >= rows)
+        ):
+            self._storage = previous._storage
+        else:
+            self._storage = torch.empty(
+                (rows, self.layout.numel), dtype=self.layout.dtype
+            )
+        self.matrix = self._storage[:rows]
+        # row of each state_dict, which is kept alive along with its id
+        self._rows: Dict[int, Tuple[int, OrderedDict]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, state_dict: OrderedDict):
+        with self._lock:
+            row = len(self._rows)
+            self._rows[id(state_dict)] = (row, state_dict)
+        self.layout.pack(state_dict, self.matrix[row])
+
+    def weighted_average(
+        self, weighted_state_dicts: Iterable[Tuple[OrderedDict, float]]
+    ) -> OrderedDict:
+        """Weighted sum of state_dicts that have been added, or of any
+        state_dicts, through `weighted_average`."""
+
+        weighted_state_dicts = list(weighted_state_dicts)
+        if any(id(entry[0]) not in self._rows for entry in weighted_state_dicts):
+            return weighted_average(weighted_state_dicts)
+        weights = torch.zeros(self.matrix.size()[0], dtype=self.layout.dtype)
+        for state_dict, weight in weighted_state_dicts:
+            weights[self._rows[id(state_dict)][0]] += float(weight)
+        return self.layout.unpack(
+            weights @ self.matrix, weighted_state_dicts[-1][0]
+        )
+
+
+class StreamingAggregation:
+    """Running weighted sum of the unit weights of the clients of a round.
+
+    The unit weights of every client are folded into the sum as soon as they
+    are received, in the thread of the client, so the aggregation holds a
+    single vector of the layout however many clients take part, and the
+    average is ready as soon as the last client has uploaded.
+    """
+
+    def __init__(self, state_dict: OrderedDict):
+        self.layout = flat_layout(state_dict)
+        self.vector = torch.zeros(self.layout.numel, dtype=self.layout.dtype)
+        self._views = [
+            view.view(shape)
+            for view, shape in zip(self.vector.split(self.layout.numels), self.layout.shapes)
+        ]
+        self.weight = 0.0
+        self.count = 0
+        self._others: Optional[OrderedDict] = None
+        self._lock = threading.Lock()
+
+    def add(self, state_dict: OrderedDict, weight: float):
+        with self._lock:
+            for view, key in zip(self._views, self.layout.flat_keys):
+                view.add_(state_dict[key].detach(), alpha=float(weight))
+            self.weight += float(weight)
+            self.count += 1
+            self._others = state_dict
+
+    def average(self) -> OrderedDict:
+        """Weighted average of the state_dicts, as `weighted_average` with the
+        weights normalized. The other entries are those of the last
+        state_dict."""
+
+        if self._others == None:
+            raise AggregationException("No state_dict was aggregated")
+        return self.layout.unpack(self.vector/self.weight, self._others)
+
+
+
+class BufferedAggregation:
+    """Global weights updated with buffers of client updates, as in FedBuff.
+
+    The update of a client is the difference between its unit weights and the
+    global weights it trained from, scaled by a function of its staleness,
+    i.e., the number of global updates since those weights. Once
+    `buffer_size` updates are buffered, their average, weighted by the inputs
+    of the clients, is applied to the global weights with the server learning
+    rate. With buffers of all the clients and a learning rate of 1, that is
+    `fed_avg`.
+
+    The global weights are a new vector after every update, so the vector a
+    client trains from is kept as long as the client does.
+    """
+
+    def __init__(
+        self, state_dict: OrderedDict, buffer_size: int,
+        staleness: Callable[[int], float], learning_rate: float = 1.0,
+    ):
+        self.layout = flat_layout(state_dict)
+        self.buffer_size = buffer_size
+        self.staleness = staleness
+        self.learning_rate = learning_rate
+        self.vector = self.layout.pack(
+            state_dict, torch.empty(self.layout.numel, dtype=self.layout.dtype)
+        )
+        self.updates = 0
+        self.buffered = 0
+        self._others = state_dict
+        # global weights each client trains from, with the number of updates
+        # at the time
+        self.bases: Dict[Hashable, Tuple[torch.Tensor, int]] = {}
+        self._delta = torch.zeros_like(self.vector)
+        self._packed = torch.empty_like(self.vector)
+        self._weight = 0.0
+        self._lock = threading.Lock()
+
+    def state_dict(self) -> OrderedDict:
+        """Current global weights, which later updates do not modify."""
+
+        with self._lock:
+            return self.layout.unpack(self.vector, self._others)
+
+    def base_set(self, client: Hashable):
+        """`client` trains from the current global weights."""
+
+        with self._lock:
+            self.bases[client] = (self.vector, self.updates)
+
+    def add(self, state_dict: OrderedDict, client: Hashable, weight: float) -> int:
+        """Buffer the unit weights `client` trained, and update the global
+        weights once the buffer is full.
+
+        Returns the staleness of the update.
+        """
+
+        with self._lock:
+            base, updates = self.bases.pop(client)
+            staleness = self.updates - updates
+            scale = float(weight)*self.staleness(staleness)
+            self.layout.pack(state_dict, self._packed)
+            self._delta.add_(self._packed, alpha=scale)
+            self._delta.add_(base, alpha=-scale)
+            self._weight += float(weight)
+            self.buffered += 1
+            self._others = state_dict
+            if self.buffered >= self.buffer_size:
+                self._apply()
+            return staleness
+
+    def flush(self) -> bool:
+        """Update the global weights with a partially filled buffer.
+
+        Returns whether there was any update to apply.
+        """
+
+        with self._lock:
+            if self.buffered == 0:
+                return False
+            self._apply()
+            return True
+
+    def _apply(self):
+        if self._weight > 0:
+            self.vector = self.vector + (self.learning_rate/self._weight)*self._delta
+        self.updates += 1
+        self.buffered = 0
+        self._weight = 0.0
+        self._delta.zero_()
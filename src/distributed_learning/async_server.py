@@ -0,0 +1,302 @@
+import asyncio
+import threading
+import logging
+import os
+import time
+import tqdm
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Set
+
+from .communicator import AsyncCommunicator, encode_msg, msg_type_check
+from .server import (
+    SplitFedServer, SplitFedServerThread, InitSplitFedServerException,
+    CollectionValidateModelState, ClientStalledException,
+)
+from .weight_sync import GlobalWeightsBroadcast
+from .transports import UnsupportedTransport
+
+
+logger = logging.getLogger(__name__)
+
+
+class SplitFedServerSession(SplitFedServerThread):
+    """Server side of a client connection, served by coroutines.
+
+    The exchange with the client is the one of `SplitFedServerThread`, but the
+    messages are sent and received on the event loop of the server, and the
+    forward and backward passes run on its compute executor.
+    """
+
+    comm: AsyncCommunicator
+
+    def __init__(
+        self, comm, neural_network, cls_optimizer, criterion,
+        executor: ThreadPoolExecutor,
+    ):
+        super().__init__(comm, neural_network, cls_optimizer, criterion)
+        self.executor = executor
+
+    async def _call(self, method, *args):
+        """Run `method` on the compute executor."""
+
+        return await self.comm.loop.run_in_executor(self.executor, method, *args)
+
+    async def codecs_negotiate(self):
+        _, requested = await self.comm.recv_msg(
+            expect_msg_type='MSG_CODECS_CLIENT_TO_SERVER'
+        )
+        accepted = self._codecs_accept(requested)
+        await self.comm.send_msg(['MSG_CODECS_SERVER_TO_CLIENT', accepted])
+
+    async def _recv_in_round(self, expect_msg_type=None):
+        timeout = None
+        if self.round_deadline != None:
+            timeout = self.round_deadline.stall_timeout()
+        if (timeout != None) and (not await self.comm.wait_readable(timeout)):
+            raise ClientStalledException(f"Client {self.comm.ip} stalled")
+        return await self.comm.recv_msg(expect_msg_type)
+
+    async def train_offloading(self):
+        try:
+            await self._train_offloading()
+        except ClientStalledException:
+            self._stalled_cut_off()
+
+    async def _train_offloading(self):
+        self._loss_validation = None
+        self._unit_state_dict = None
+        self.training_end = None
+        self.neural_network.train()
+        _, iterations_number = await self._recv_in_round(
+            expect_msg_type='CLIENT_TRAINING_ITERATIONS_NUMBER'
+        )
+        logger.debug(f"Number training iterations: {iterations_number}")
+        training_start = time.time()
+        self.inputs_total = 0
+        self.cut_off = False
+        training_time = None
+        s_bytes = self.comm.bytes_sent + self.comm.bytes_received
+        for i in tqdm.tqdm(range(iterations_number)):
+            msg = await self._recv_in_round('MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER')
+            if self._deadline_passed():
+                await self.comm.send_msg(['MSG_ROUND_DEADLINE_SERVER_TO_CLIENT'])
+                training_time = await self._train_cut_off()
+                break
+            await self.comm.send_msg(await self._call(self._train_step, msg))
+        self._log_bytes_per_iteration(s_bytes, iterations_number)
+        if training_time == None:
+            training_time = await self._recv_in_round(
+                expect_msg_type='MSG_TRAINING_TIME_PER_ITERATION'
+            )
+        self.training_end = time.time()
+        self.throughput = self.inputs_total/max(self.training_end - training_start, 1e-9)
+        self.rounds_completed += 1
+
+    async def round_start(
+        self, selected: bool = True,
+        broadcast: Optional[GlobalWeightsBroadcast] = None,
+    ):
+        await self.comm.send_msg([
+            'MSG_ROUND_START_SERVER_TO_CLIENT', selected, broadcast != None
+        ])
+        if broadcast != None:
+            await self.neural_network_load_client(broadcast)
+
+    async def _train_cut_off(self):
+        self.cut_off = True
+        msg = await self._recv_in_round()
+        while msg[0] == 'MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER':
+            await self.comm.send_msg(['MSG_ROUND_DEADLINE_SERVER_TO_CLIENT'])
+            msg = await self._recv_in_round()
+        return msg_type_check(msg, 'MSG_TRAINING_TIME_PER_ITERATION')
+
+    async def neural_network_unit_compose(
+        self, neural_network_unit, flat_aggregation=None
+    ):
+        try:
+            msg = await self._recv_in_round(
+                expect_msg_type='MSG_LOCAL_WEIGHTS_CLIENT_TO_SERVER'
+            )
+        except ClientStalledException:
+            self._stalled_cut_off()
+            return None
+        return await self._call(
+            self._unit_compose, neural_network_unit, msg, flat_aggregation
+        )
+
+    async def neural_network_unit_fold(
+        self, neural_network_unit, streaming_aggregation
+    ):
+        try:
+            msg = await self._recv_in_round(
+                expect_msg_type='MSG_LOCAL_WEIGHTS_CLIENT_TO_SERVER'
+            )
+        except ClientStalledException:
+            self._stalled_cut_off()
+            return
+        await self._call(
+            self._unit_fold, neural_network_unit, msg, streaming_aggregation
+        )
+
+    async def train_offloading_fold(
+        self, neural_network_unit, streaming_aggregation
+    ):
+        await self.train_offloading()
+        if not self.stalled:
+            await self.neural_network_unit_fold(
+                neural_network_unit, streaming_aggregation
+            )
+
+    async def neural_network_load_client(self, broadcast: GlobalWeightsBroadcast):
+        buffers = await self._call(broadcast.buffers, self.weight_sync)
+        await self.comm.send_buffers(buffers)
+        self.base_version = broadcast.version
+
+    async def validate_model(self, validate_model_state):
+        await self.comm.send_msg([
+            "MODEL_TO_VALIDATE", validate_model_state.unit_state_dict
+        ])
+        _, batch_num = await self.comm.recv_msg(
+            expect_msg_type="MODEL_VALIDATION_ITERATIONS_NUMBER"
+        )
+        for i in tqdm.tqdm(range(batch_num)):
+            await self.comm.recv_msg(expect_msg_type="MODEL_VALIDATION_ITERATION")
+        _, validate_model_state.validation_result = await self.comm.recv_msg(
+            expect_msg_type='MODEL_VALIDATION_RESULT'
+        )
+
+    async def validate_models(
+        self, validate_models: CollectionValidateModelState, buffers=None
+    ):
+        if buffers == None:
+            buffers = encode_msg([
+                "MODELS_TO_VALIDATE", validate_models.models_to_validate()
+            ])
+        await self.comm.send_buffers(buffers)
+        _, batch_num = await self.comm.recv_msg(
+            expect_msg_type="MODELS_VALIDATION_ITERATIONS_NUMBER"
+        )
+        for i in tqdm.tqdm(range(batch_num)):
+            await self.comm.recv_msg(expect_msg_type="MODELS_VALIDATION_ITERATION")
+        _, validation_results = await self.comm.recv_msg(
+            expect_msg_type='MODELS_VALIDATION_RESULT'
+        )
+        validate_models.validation_result = validation_results
+
+    async def validate(self):
+        _, iterations_number = await self.comm.recv_msg(
+            expect_msg_type='CLIENT_VALIDATION_ITERATIONS_NUMBER'
+        )
+        logger.debug(f"Number validation iterations: {iterations_number}")
+        self._validate_start()
+        for i in tqdm.tqdm(range(iterations_number)):
+            msg = await self.comm.recv_msg('MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER')
+            await self._call(self._validate_step, msg)
+
+
+class AsyncSplitFedServer(SplitFedServer):
+    """Split federated server with one event loop for all the clients.
+
+    The clients are served by `SplitFedServerSession` coroutines on an event
+    loop, which runs in its own thread, instead of one thread per client and
+    phase. The training and validation computations are run on an executor of
+    `compute_workers` threads, which bounds the number of them that run at
+    once however many clients are connected. The rounds and the aggregation
+    methods are those of `SplitFedServer`.
+    """
+
+    executor: ThreadPoolExecutor
+    loop: asyncio.AbstractEventLoop
+    thread_loop: threading.Thread
+    _sessions_connecting: Set[asyncio.Task]
+
+    def __init__(
+        self, ip_address, server_port, neural_network_unit,
+        cls_optimizer, criterion, nn_server_creator, split_layer,
+        compute_workers: Optional[int] = None, transport: Optional[str] = None,
+        round_deadline_spec: Optional[str] = None,
+        client_sampling_spec: Optional[str] = None,
+    ):
+        super().__init__(
+            ip_address, server_port, neural_network_unit, cls_optimizer,
+            criterion, nn_server_creator, split_layer, transport,
+            round_deadline_spec, client_sampling_spec,
+        )
+        # the event loop serves the sockets of the stream transports only
+        if self.transport not in ("tcp", "unix"):
+            raise UnsupportedTransport(
+                f"{self.transport} is not supported by the async engine"
+            )
+        self.sock = self.listener.sock
+        self.sock.setblocking(False)
+        self.executor = ThreadPoolExecutor(
+            max_workers=compute_workers or os.cpu_count(),
+            thread_name_prefix="thread_compute",
+        )
+        self.loop = asyncio.new_event_loop()
+        self.thread_loop = threading.Thread(
+            target=self.loop.run_forever, name="thread_loop", daemon=True
+        )
+        self._sessions_connecting = set()
+
+    async def create_session(self, comm):
+        session = SplitFedServerSession(
+            comm, self.nn_server_creator(self.split_layer),
+            self.cls_optimizer, self.criterion, self.executor,
+        )
+        session.optimizer(
+            *self.struct_optimizer_constructor.args,
+            **self.struct_optimizer_constructor.kwargs,
+        )
+        await session.codecs_negotiate()
+        with self.pending_lock:
+            self.pending_clients.append(session)
+
+    async def _listen(self):
+        logger.info("Ready to connect")
+        while True:
+            (sock, address) = await self.loop.sock_accept(self.sock)
+            logger.info(f'Client connected: {address}')
+            # a slow client does not hold back the next connections
+            task = self.loop.create_task(
+                self.create_session(AsyncCommunicator(sock, self.loop))
+            )
+            self._sessions_connecting.add(task)
+            task.add_done_callback(self._sessions_connecting.discard)
+
+    def listen(self):
+        if not hasattr(self, "struct_optimizer_constructor"):
+            raise InitSplitFedServerException(
+                "Optimizer was not initialized."
+            )
+        self.thread_loop.start()
+        asyncio.run_coroutine_threadsafe(self._listen(), self.loop)
+
+    @SplitFedServer.stop_server.setter
+    def stop_server(self, value: bool):
+        SplitFedServer.stop_server.fset(self, value)
+        if value and self.thread_loop.is_alive():
+            asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.executor.shutdown(wait=False)
+            self.listener.close()
+
+    async def _stop(self):
+        """Cancel the listener and the sessions still connecting."""
+
+        tasks = [
+            task for task in asyncio.all_tasks()
+            if task is not asyncio.current_task()
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run_clients(self, name, calls):
+        """Run the `(coroutine function, args)` calls of client sessions
+        concurrently on the event loop, and wait for all of them."""
+
+        async def run_calls():
+            await asyncio.gather(*(method(*args) for method, args in calls))
+        asyncio.run_coroutine_threadsafe(run_calls(), self.loop).result()
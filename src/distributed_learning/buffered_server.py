@@ -0,0 +1,199 @@
+import os
+import threading
+import logging
+import time
+
+from typing import Callable, List, Optional
+
+from . import aggregation
+from . import utils
+from .server import SplitFedServer, SplitFedServerThread
+from .weight_sync import GlobalWeightsBroadcast
+
+
+logger = logging.getLogger(__name__)
+
+STALENESS_FUNCTIONS = ["constant", "polynomial", "hinge"]
+
+
+class BufferedSplitFedServerException(Exception):
+    pass
+
+
+def staleness_spec_env() -> str:
+    """Staleness weighting of the buffered updates requested through the
+    environment."""
+
+    return os.getenv("STALENESS", "polynomial:0.5")
+
+def buffer_size_env() -> Optional[int]:
+    """Number of updates per global update requested through the
+    environment, if any."""
+
+    buffer_size = os.getenv("BUFFER_SIZE")
+    return int(buffer_size) if buffer_size else None
+
+
+def staleness_function_create(spec: str) -> Callable[[int], float]:
+    """Create the weight of an update from its staleness `s`.
+
+    - `constant`: 1.
+    - `polynomial[:a]`: (1 + s)^-a, with `a` 0.5 by default, as in FedBuff.
+    - `hinge[:a[:b]]`: 1 up to a staleness of `b`, then 1/(a(s - b) + 1), with
+      `a` 10 and `b` 4 by default, as in FedAsync.
+    """
+
+    name, *params = spec.split(":")
+    try:
+        values = [float(param) for param in params]
+    except ValueError:
+        raise BufferedSplitFedServerException(f"Unsupported staleness: {spec}")
+    if (name == "constant") and (len(values) == 0):
+        return lambda s: 1.0
+    if (name == "polynomial") and (len(values) <= 1):
+        a = values[0] if len(values) > 0 else 0.5
+        return lambda s: (1 + s)**(-a)
+    if (name == "hinge") and (len(values) <= 2):
+        a, b = [*values, *[10.0, 4.0][len(values):]]
+        return lambda s: 1.0 if s <= b else 1/(a*(s - b) + 1)
+    raise BufferedSplitFedServerException(f"Unsupported staleness: {spec}")
+
+
+class BufferedSplitFedServer(SplitFedServer):
+    """Split federated server with buffered asynchronous rounds, as in FedBuff.
+
+    There is no barrier between the rounds of the clients: as soon as a
+    client is done training, its unit weights are buffered as an update of
+    the global weights, see `aggregation.BufferedAggregation`, and the client
+    gets the current global weights to start its next round right away. The
+    global weights are updated once `buffer_size` updates are buffered, by
+    default half of the clients, so the slowest clients no longer set the
+    pace of the fastest ones. The clients run the `fed_avg` exchange.
+    """
+
+    buffered_aggregation: Optional[aggregation.BufferedAggregation]
+
+    def __init__(
+        self, *args, buffer_size: Optional[int] = None,
+        staleness_spec: Optional[str] = None, learning_rate: float = 1.0,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        if buffer_size == None:
+            buffer_size = buffer_size_env()
+        if staleness_spec == None:
+            staleness_spec = staleness_spec_env()
+        self.buffer_size = buffer_size
+        self.staleness = staleness_function_create(staleness_spec)
+        self.learning_rate = learning_rate
+        self.buffered_aggregation = None
+        self.aggregation_lock = threading.Lock()
+        # time of every update of the global weights
+        self.update_times: List[float] = []
+
+    def train_buffered(self, min_clients=1, rounds=1):
+        """Train `rounds` rounds on every connected client, without barriers
+        between the rounds.
+
+        Returns once every client has completed its rounds. The updates that
+        are still buffered then are applied, and every client gets the
+        resulting global weights, such that they all validate the same model.
+        """
+
+        self._clients_wait(min_clients)
+        client_threads = list(self.threads)
+        # every client trains its rounds, whatever the client sampling
+        self.round_threads = client_threads
+        if self.buffered_aggregation == None:
+            buffer_size = self.buffer_size or max(1, len(client_threads)//2)
+            self.buffered_aggregation = aggregation.BufferedAggregation(
+                self.neural_network_unit.state_dict(), buffer_size,
+                self.staleness, self.learning_rate,
+            )
+            # the weights are broadcast from the vector of the aggregation
+            self._broadcast = None
+        for client_thread in client_threads:
+            # the rounds of the clients are not bound by a common deadline
+            client_thread.round_deadline = None
+            # clients that joined since got the current global weights
+            if client_thread not in self.buffered_aggregation.bases:
+                self.buffered_aggregation.base_set(client_thread)
+        barrier = threading.Barrier(len(client_threads), action=self._buffer_flush)
+        self._run_clients("buffered", [
+            (self._client_rounds, (client_thread, rounds, barrier))
+            for client_thread in client_threads
+        ])
+
+    def _client_rounds(
+        self, client_thread: SplitFedServerThread, rounds: int,
+        barrier: threading.Barrier,
+    ):
+        try:
+            for r in range(rounds):
+                client_thread.round_start()
+                client_thread.train_offloading()
+                msg = client_thread.comm.recv_msg(
+                    expect_msg_type='MSG_LOCAL_WEIGHTS_CLIENT_TO_SERVER'
+                )
+                self._buffer_update(client_thread, msg)
+                if r == rounds - 1:
+                    barrier.wait()
+                self._global_weights_send(client_thread)
+        except Exception:
+            # the other clients no longer wait for this one at the end
+            barrier.abort()
+            raise
+
+    def _buffer_update(self, client_thread: SplitFedServerThread, msg):
+        unit_state_dict = client_thread._unit_concat(self.neural_network_unit, msg)
+        with self.aggregation_lock:
+            updates = self.buffered_aggregation.updates
+            staleness = self.buffered_aggregation.add(
+                unit_state_dict, client_thread, client_thread.inputs_total
+            )
+            logger.info(
+                f"Update of client {client_thread.comm.ip}, round "
+                f"{client_thread.rounds_completed}, from version "
+                f"{client_thread.base_version}: staleness {staleness}"
+            )
+            if self.buffered_aggregation.updates != updates:
+                self._global_update()
+
+    def _buffer_flush(self):
+        with self.aggregation_lock:
+            if self.buffered_aggregation.flush():
+                self._global_update()
+
+    def _global_broadcast(self, client_thread: SplitFedServerThread):
+        if self.buffered_aggregation == None:
+            return super()._global_broadcast(client_thread)
+        if (self._broadcast == None) or (self._broadcast.version != self.global_version):
+            # views of the vector of the version, which the updates do not
+            # modify while the weights are encoded
+            self._broadcast = GlobalWeightsBroadcast(
+                'MSG_INITIAL_GLOBAL_WEIGHTS_SERVER_TO_CLIENT',
+                utils.slice_weights_client(
+                    self.buffered_aggregation.state_dict(),
+                    client_thread.neural_network.state_dict(),
+                ),
+                self.global_version,
+            )
+        return self._broadcast
+
+    def _global_update(self):
+        self.neural_network_unit.load_state_dict(
+            self.buffered_aggregation.state_dict()
+        )
+        self.global_version += 1
+        self.update_times.append(time.time())
+        logger.info(f"Global weights updated to version {self.global_version}")
+
+    def _global_weights_send(self, client_thread: SplitFedServerThread):
+        """Send the current global weights to the client, which trains its
+        next round from them."""
+
+        with self.aggregation_lock:
+            broadcast = self._global_broadcast(client_thread)
+            client_thread.neural_network_load_server(self.neural_network_unit)
+            self.buffered_aggregation.base_set(client_thread)
+        client_thread.neural_network_load_client(broadcast)
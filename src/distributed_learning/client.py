@@ -6,11 +6,20 @@ import numpy as np
 import sys
 import logging
 
-from typing import Type, Optional
+import collections
+
+from typing import Deque, Dict, Type, Optional
 from functools import partial
 
 from . import utils
-from .communicator import Communicator
+from . import codecs
+from .communicator import Communicator, msg_type_check
+from .transports import communicator_connect, transport_env
+from .weight_sync import WeightSync, weight_sync_spec_env
+from .pipeline import (
+    MicroBatch, PipelineConfig, pipeline_config_create, pipeline_spec_env,
+    stash_forward, stash_gradients_apply,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -34,12 +43,18 @@ class SplitFedClient:
     conn: Communicator
     cls_optimizer: Type[torch.optim.Optimizer]
     _optimizer: torch.optim.Optimizer
+    codec_activations: codecs.Codec
+    codec_gradients: codecs.Codec
+    weight_sync: WeightSync
+    pipeline: PipelineConfig
 
     def __init__(
         self, server_addr, server_port, model_name, 
         split_layer, criterion, cls_optimizer: Type[torch.optim.Optimizer], 
         neural_network: torch.nn.Module, neural_network_unit: torch.nn.Module,
-        dataloader_validate=None
+        dataloader_validate=None, codec_specs: Optional[Dict[str, str]] = None,
+        weight_sync_spec: Optional[str] = None,
+        pipeline_spec: Optional[str] = None, transport: Optional[str] = None,
     ):
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         self.model_name = model_name
@@ -48,11 +63,46 @@ class SplitFedClient:
         self.cls_optimizer = cls_optimizer
         self.neural_network_unit = neural_network_unit
         self.dataloader_validate = dataloader_validate
+        # whether the client takes part in the current round
+        self.round_selected = True
+        self.weight_sync = WeightSync(
+            weight_sync_spec if weight_sync_spec != None else weight_sync_spec_env()
+        )
+        self.pipeline = pipeline_config_create(
+            pipeline_spec if pipeline_spec != None else pipeline_spec_env()
+        )
         logger.info('Connecting to Server.')
-        self.conn = Communicator()
-        self.conn.connect((server_addr, server_port))
+        self.conn = communicator_connect(
+            transport if transport != None else transport_env(),
+            server_addr, server_port,
+        )
+        self._codecs_negotiate(codec_specs)
         self._weights_receive()
 
+    def _codecs_negotiate(self, codec_specs: Optional[Dict[str, str]]):
+        """Agree with the server on the codecs of the split layer exchange.
+
+        The codecs requested by the client, by default through the
+        ACTIVATION_CODEC and GRADIENT_CODEC environment variables, are replaced
+        with `identity` by the server if it does not support them.
+        """
+
+        if codec_specs == None:
+            codec_specs = codecs.codec_specs_env()
+        self.conn.send_msg(['MSG_CODECS_CLIENT_TO_SERVER', codec_specs])
+        _, accepted = self.conn.recv_msg(
+            expect_msg_type='MSG_CODECS_SERVER_TO_CLIENT'
+        )
+        logger.info(f"Split layer codecs: {accepted}")
+        self.codec_activations = codecs.codec_create(accepted["activations"])
+        self.codec_gradients = codecs.codec_create(accepted["gradients"])
+
+    def _activations_msg(self, outputs, targets):
+        return [
+            'MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER',
+            *self.codec_activations.encode(outputs.cpu()), targets.cpu(),
+        ]
+
 
     def optimizer(self, *args, **kwargs): 
         self._optimizer = self.cls_optimizer(
@@ -66,29 +116,117 @@ class SplitFedClient:
             logger.exception("Optimizer has not been initialized.")
             raise
 
+        # every round starts on every client, but the clients that are not
+        # selected for it sit it out, and skip its aggregation and validation.
+        # The selected clients first get the global weights they missed in
+        # the rounds they sat out.
+        _, self.round_selected, weights_follow = self.conn.recv_msg(
+            expect_msg_type='MSG_ROUND_START_SERVER_TO_CLIENT'
+        )
+        if weights_follow: 
+            self._weights_receive()
+        if not self.round_selected: 
+            logger.info("Not selected for the round")
+            return None
         msg = ['CLIENT_TRAINING_ITERATIONS_NUMBER', len(dataloader_train)]
         self.conn.send_msg(msg)
         s_time_total = time.time()
+        s_bytes = self.conn.bytes_sent + self.conn.bytes_received
         self.neural_network.to(self.device)
         self.neural_network.train()
-        for inputs, targets in tqdm.tqdm(dataloader_train):
-            inputs, targets = inputs.to(self.device), targets.to(self.device)
-            self._optimizer.zero_grad()
-            outputs = self.neural_network(inputs)
-            msg = ['MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER', outputs.cpu(), targets.cpu()]
-            self.conn.send_msg(msg)
-            gradients = self.conn.recv_msg()[1].to(self.device)
-            outputs.backward(gradients)
-            self._optimizer.step()
+        if self.pipeline.enabled: 
+            self._train_pipelined(dataloader_train)
+        else: 
+            for inputs, targets in tqdm.tqdm(dataloader_train):
+                inputs, targets = inputs.to(self.device), targets.to(self.device)
+                self._optimizer.zero_grad()
+                outputs = self.neural_network(inputs)
+                self.conn.send_msg(self._activations_msg(outputs, targets))
+                if not self._backward(outputs): 
+                    break
+                self._optimizer.step()
         e_time_total = time.time()
+        e_bytes = self.conn.bytes_sent + self.conn.bytes_received
         logger.info('Total time: ' + str(e_time_total - s_time_total))
         training_time_pr = (e_time_total - s_time_total) / len(dataloader_train)
         logger.info('training_time_per_iteration: ' + str(training_time_pr))
+        logger.info(
+            'bytes_per_iteration: ' + str((e_bytes - s_bytes) / len(dataloader_train))
+        )
         msg = ['MSG_TRAINING_TIME_PER_ITERATION', self.conn.ip, training_time_pr]
         self.conn.send_msg(msg)
         return e_time_total - s_time_total
-        
+
+    def _backward(self, outputs, scale=1.0) -> bool: 
+        """Backward pass with the gradients of the next gradients message.
+
+        Returns False, without a backward pass, if the server has cut the
+        training of the round off at its deadline instead, in which case it
+        answers all the following activations of the round the same way.
+        """
+
+        msg = self.conn.recv_msg()
+        if msg[0] == 'MSG_ROUND_DEADLINE_SERVER_TO_CLIENT': 
+            logger.info("Training cut off at the round deadline")
+            return False
+        msg_type_check(msg, 'MSG_SERVER_GRADIENTS_SERVER_TO_CLIENT')
+        gradients = self.codec_gradients.decode(msg[1:]).to(self.device)
+        outputs.backward(gradients if scale == 1.0 else gradients*scale)
+        return True
+
+    def _train_pipelined(self, dataloader_train): 
+        """Training iterations with up to `pipeline.depth` micro-batches in
+        flight, see `PipelineConfig`.
+
+        The server handles the activations in order, so the gradients arrive
+        in the order of the micro-batches in flight.
+        """
+
+        stash = self.pipeline.mode == "stash"
+        in_flight: Deque[MicroBatch] = collections.deque()
+
+        def backward_oldest(): 
+            micro_batch = in_flight.popleft()
+            if not self._backward(micro_batch.outputs): 
+                return False
+            stash_gradients_apply(self.neural_network, micro_batch)
+            self._optimizer.step()
+            return True
+
+        def drain(): 
+            scale = 1/len(in_flight)
+            # the answers of all the micro-batches are received, even past
+            # the deadline
+            completed = [
+                self._backward(in_flight.popleft().outputs, scale)
+                for _ in range(len(in_flight))
+            ]
+            if all(completed): 
+                self._optimizer.step()
+            self._optimizer.zero_grad()
+            return all(completed)
+
+        self._optimizer.zero_grad()
+        for inputs, targets in tqdm.tqdm(dataloader_train):
+            inputs, targets = inputs.to(self.device), targets.to(self.device)
+            if stash: 
+                micro_batch = stash_forward(self.neural_network, inputs)
+            else: 
+                micro_batch = MicroBatch(self.neural_network(inputs))
+            self.conn.send_msg(self._activations_msg(micro_batch.outputs, targets))
+            in_flight.append(micro_batch)
+            if len(in_flight) >= self.pipeline.depth: 
+                if not (backward_oldest() if stash else drain()): 
+                    break
+        if stash: 
+            while len(in_flight) > 0: 
+                backward_oldest()
+        elif len(in_flight) > 0: 
+            drain()
+
     def aggregate(self, method): 
+        if not self.round_selected: 
+            return
         if method == "fed_avg":
             self.fed_avg_client()
         elif method in ["best_validation_model", "validation_softmax"]:
@@ -158,6 +296,8 @@ class SplitFedClient:
     def validate(
         self, dataloader_validate: Optional[torch.utils.data.DataLoader] = None
     ): 
+        if not self.round_selected: 
+            return
         iter_validate = (len(dataloader_validate) 
             if dataloader_validate != None else 0
         )
@@ -169,16 +309,18 @@ class SplitFedClient:
         with torch.no_grad(): 
             for inputs, targets in tqdm.tqdm(dataloader_validate):
                 outputs = self.neural_network(inputs)
-                msg = ['MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER', outputs.cpu(), targets.cpu()]
-                self.conn.send_msg(msg)
+                self.conn.send_msg(self._activations_msg(outputs, targets))
 
     def _weights_upload(self):
-        msg = ['MSG_LOCAL_WEIGHTS_CLIENT_TO_SERVER', self.neural_network.cpu().state_dict()]
+        msg = [
+            'MSG_LOCAL_WEIGHTS_CLIENT_TO_SERVER',
+            *self.weight_sync.encode_local(self.neural_network.cpu().state_dict()),
+        ]
         self.conn.send_msg(msg)
 
     def _weights_receive(self):
         logger.debug('Receive Global Weights..')
-        weights = self.conn.recv_msg()[1]
+        weights = self.weight_sync.decode_global(self.conn.recv_msg()[1:])
         pweights = utils.split_weights_client(weights, self.neural_network.state_dict())
         self.neural_network.load_state_dict(pweights)
 
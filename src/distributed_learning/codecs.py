@@ -0,0 +1,165 @@
+import os
+import torch
+
+from typing import Dict, Hashable, List, Tuple
+
+
+class UnknownCodec(Exception):
+    pass
+
+
+class Codec:
+    """Encoding of the tensors exchanged at the split layer.
+
+    A tensor is encoded as a list of tensors, which the Communicator sends
+    straight from their buffers, and decoded back into a float tensor with the
+    same shape. Codecs with a state across the tensors they encode keep one
+    per `key`, which tells apart the tensors encoded by the same codec, e.g.
+    parameter names.
+    """
+
+    name = "identity"
+
+    def encode(self, tensor: torch.Tensor, key: Hashable = None) -> List[torch.Tensor]:
+        return [tensor]
+
+    def decode(self, items: List[torch.Tensor]) -> torch.Tensor:
+        return items[0]
+
+
+class CastCodec(Codec):
+    """Cast to a 16 bit floating point dtype."""
+
+    def __init__(self, name: str, dtype: torch.dtype):
+        self.name = name
+        self.dtype = dtype
+
+    def encode(self, tensor, key=None):
+        return [tensor.detach().to(self.dtype)]
+
+    def decode(self, items):
+        return items[0].to(torch.get_default_dtype())
+
+
+class Int8Codec(Codec):
+    """Per-tensor affine quantization to int8.
+
+    The range [min, max] of the tensor is mapped onto the 256 levels of int8,
+    and the scale and minimum are sent along with the quantized tensor.
+    """
+
+    name = "int8"
+
+    def encode(self, tensor, key=None):
+        tensor = tensor.detach()
+        if tensor.numel() == 0:
+            return [
+                tensor.to(torch.int8), torch.tensor([1.0, 0.0], dtype=torch.float32)
+            ]
+        minimum, maximum = tensor.min(), tensor.max()
+        scale = torch.clamp((maximum - minimum)/255, min=1e-12)
+        quantized = torch.round((tensor - minimum)/scale) - 128
+        return [
+            quantized.to(torch.int8),
+            torch.stack((scale, minimum)).to(torch.float32),
+        ]
+
+    def decode(self, items):
+        quantized, (scale, minimum) = items
+        return (quantized.to(torch.get_default_dtype()) + 128)*scale + minimum
+
+
+class TopKCodec(Codec):
+    """Top-k sparsification, with optional error feedback.
+
+    Only the `ratio` largest entries, in magnitude, are sent. With
+    `error_feedback`, the entries that are not sent are accumulated and added
+    to the next tensor with the same key and shape, such that no part of a
+    tensor that persists between the steps, e.g. the delta of a parameter, is
+    lost over the iterations. Tensors without a key, like the split layer
+    gradients of a batch, belong to other samples at every step and never
+    carry a residual over.
+    """
+
+    name = "topk"
+
+    def __init__(self, ratio: float = 0.01, error_feedback: bool = False):
+        self.ratio = ratio
+        self.error_feedback = error_feedback
+        self._residuals: Dict[Tuple[Hashable, Tuple[int, ...]], torch.Tensor] = {}
+
+    def encode(self, tensor, key=None):
+        tensor = tensor.detach()
+        shape = tuple(tensor.shape)
+        feedback = self.error_feedback and (key != None)
+        accumulated = tensor.reshape(-1).clone()
+        if feedback and ((key, shape) in self._residuals):
+            accumulated += self._residuals[(key, shape)]
+        k = min(max(1, int(self.ratio*accumulated.numel())), accumulated.numel())
+        indices = torch.topk(accumulated.abs(), k, sorted=False).indices
+        values = accumulated[indices]
+        if feedback:
+            accumulated[indices] = 0
+            self._residuals[(key, shape)] = accumulated
+        return [values, indices.to(torch.int32), torch.tensor(shape)]
+
+    def decode(self, items):
+        values, indices, shape = items
+        tensor = torch.zeros(
+            int(torch.prod(shape)), dtype=torch.get_default_dtype()
+        )
+        tensor[indices.to(torch.int64)] = values
+        return tensor.reshape(shape.tolist())
+
+
+CODECS = {
+    "identity": lambda: Codec(),
+    "fp16": lambda: CastCodec("fp16", torch.float16),
+    "bf16": lambda: CastCodec("bf16", torch.bfloat16),
+    "int8": lambda: Int8Codec(),
+    "topk": lambda ratio="0.01": TopKCodec(float(ratio)),
+}
+# sparsifying the activations would change the input of the server model
+ACTIVATION_CODECS = ["identity", "fp16", "bf16", "int8"]
+
+def codec_create(spec: str) -> Codec:
+    """Create a codec from its specification, `<name>[:<argument>]`.
+
+    E.g., `fp16`, or `topk:0.05` to send 5% of the entries of every gradient.
+    """
+
+    name, *arguments = spec.split(":")
+    if name not in CODECS:
+        raise UnknownCodec(spec)
+    return CODECS[name](*arguments)
+
+def codec_supported(spec: str) -> bool:
+    try:
+        codec_create(spec)
+        return True
+    except (UnknownCodec, TypeError, ValueError):
+        return False
+
+def codec_specs_env() -> Dict[str, str]:
+    """Codecs of the split layer exchange requested through the environment."""
+
+    return {
+        "activations": os.getenv("ACTIVATION_CODEC", "identity"),
+        "gradients": os.getenv("GRADIENT_CODEC", "identity"),
+    }
+
+def codec_specs_negotiate(requested: Dict[str, str]) -> Dict[str, str]:
+    """Codecs accepted by the server for the codecs requested by a client.
+
+    Unsupported codecs fall back to `identity`, and top-k is only accepted
+    for the gradients.
+    """
+
+    accepted = {"activations": "identity", "gradients": "identity"}
+    activations = requested.get("activations", "identity")
+    if codec_supported(activations) and (activations.split(":")[0] in ACTIVATION_CODECS):
+        accepted["activations"] = activations
+    gradients = requested.get("gradients", "identity")
+    if codec_supported(gradients):
+        accepted["gradients"] = gradients
+    return accepted
@@ -1,10 +1,13 @@
 import pickle
+import asyncio
+import select
 import struct
 import socket
 import logging
 import sys
+import torch
 
-from typing import Tuple
+from typing import Any, List, Optional, Tuple
 
 
 logger = logging.getLogger(__name__)
@@ -16,36 +19,348 @@ handler_console.setLevel(logging.DEBUG)
 logger.addHandler(handler_console)
 
 
+# The id of a message type is its position in the list, so new types are only
+# ever appended.
+MESSAGE_TYPES = [
+    'Finish',
+    'MSG_INITIAL_GLOBAL_WEIGHTS_SERVER_TO_CLIENT',
+    'CLIENT_TRAINING_ITERATIONS_NUMBER',
+    'MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER',
+    'MSG_SERVER_GRADIENTS_SERVER_TO_CLIENT',
+    'MSG_TRAINING_TIME_PER_ITERATION',
+    'MSG_LOCAL_WEIGHTS_CLIENT_TO_SERVER',
+    'CLIENT_VALIDATION_ITERATIONS_NUMBER',
+    'MODEL_TO_VALIDATE',
+    'MODEL_VALIDATION_ITERATIONS_NUMBER',
+    'MODEL_VALIDATION_ITERATION',
+    'MODEL_VALIDATION_RESULT',
+    'MODELS_TO_VALIDATE',
+    'MODELS_VALIDATION_ITERATIONS_NUMBER',
+    'MODELS_VALIDATION_ITERATION',
+    'MODELS_VALIDATION_RESULT',
+    'MSG_CODECS_CLIENT_TO_SERVER',
+    'MSG_CODECS_SERVER_TO_CLIENT',
+    'MSG_ROUND_DEADLINE_SERVER_TO_CLIENT',
+    'MSG_ROUND_START_SERVER_TO_CLIENT',
+]
+MESSAGE_TYPE_IDS = {msg_type: i for i, msg_type in enumerate(MESSAGE_TYPES)}
+
+DTYPES = [
+    torch.float32, torch.float64, torch.float16, torch.bfloat16, torch.int64,
+    torch.int32, torch.int16, torch.int8, torch.uint8, torch.bool,
+]
+DTYPE_IDS = {dtype: i for i, dtype in enumerate(DTYPES)}
+
+# message type id, number of items, length of the item descriptors
+HEADER = struct.Struct(">HHI")
+# item kind, payload length
+ITEM = struct.Struct(">BQ")
+# dtype id, requires_grad, number of dimensions
+TENSOR = struct.Struct(">B?B")
+
+ITEM_PICKLE = 0
+ITEM_TENSOR = 1
+# tensor whose payload is passed out of the stream, see transports
+ITEM_TENSOR_SHM = 2
+
+# receive buffers up to this size are kept for the following messages
+RECV_BUFFER_RETAIN = 64 << 20
+
+
+class UnknownMessageType(Exception):
+    pass
+
+
+class UnexpectedMessageType(Exception):
+    pass
+
+
+def tensor_bytes(tensor: torch.Tensor) -> memoryview:
+    """Bytes of the buffer of a contiguous cpu tensor, without a copy."""
+
+    return memoryview(tensor.detach().reshape(-1).view(torch.uint8).numpy())
+
+def encode_msg(msg: List[Any]) -> List[Any]:
+    """Encode a message as the list of buffers of its frame.
+
+    The frame is a header with the message type id and the descriptors of the
+    items of the message, followed by the payload of each item. Tensors are
+    described by their dtype, shape and requires_grad, and their payload is the
+    tensor's own buffer; any other item is pickled.
+    """
+
+    msg_type, items = msg[0], msg[1:]
+    if msg_type not in MESSAGE_TYPE_IDS:
+        raise UnknownMessageType(msg_type)
+
+    descriptors = []
+    payloads = []
+    for item in items:
+        if isinstance(item, torch.Tensor) and item.dtype in DTYPE_IDS:
+            tensor = item.detach().cpu().contiguous()
+            descriptors.append(ITEM.pack(ITEM_TENSOR, tensor.nbytes))
+            descriptors.append(TENSOR.pack(
+                DTYPE_IDS[tensor.dtype], item.requires_grad, tensor.dim()
+            ))
+            descriptors.append(struct.pack(f">{tensor.dim()}Q", *tensor.shape))
+            payloads.append(tensor_bytes(tensor))
+        else:
+            payload = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+            descriptors.append(ITEM.pack(ITEM_PICKLE, len(payload)))
+            payloads.append(payload)
+
+    descriptors = b"".join(descriptors)
+    header = HEADER.pack(MESSAGE_TYPE_IDS[msg_type], len(items), len(descriptors))
+    return [header + descriptors, *payloads]
+
+def decode_descriptors(descriptors, nr_items: int) -> List[Tuple[int, int, Any]]:
+    """Kind, payload length and tensor descriptor of the items of a frame."""
+
+    items = []
+    offset = 0
+    for _ in range(nr_items):
+        kind, nbytes = ITEM.unpack_from(descriptors, offset)
+        offset += ITEM.size
+        if kind != ITEM_PICKLE:
+            dtype_id, requires_grad, ndim = TENSOR.unpack_from(descriptors, offset)
+            offset += TENSOR.size
+            shape = struct.unpack_from(f">{ndim}Q", descriptors, offset)
+            offset += 8*ndim
+            items.append((kind, nbytes, (DTYPES[dtype_id], requires_grad, shape)))
+        else:
+            items.append((kind, nbytes, None))
+    return items
+
+def decode_msg(buffers: List[Any]) -> List[Any]:
+    """Decode the message of the frame `buffers`, as encoded by
+    `encode_msg`."""
+
+    frame = memoryview(b"".join(buffers))
+    msg_type_id, nr_items, descriptors_len = HEADER.unpack_from(frame)
+    offset = HEADER.size
+    items = decode_descriptors(frame[offset:(offset + descriptors_len)], nr_items)
+    offset += descriptors_len
+    msg = [MESSAGE_TYPES[msg_type_id]]
+    for kind, nbytes, tensor_descriptor in items:
+        payload = frame[offset:(offset + nbytes)]
+        offset += nbytes
+        if kind == ITEM_PICKLE:
+            msg.append(pickle.loads(payload))
+            continue
+        tensor = tensor_empty(tensor_descriptor)
+        tensor_bytes(tensor)[:] = payload
+        msg.append(tensor)
+    return msg
+
+def tensor_empty(tensor_descriptor) -> torch.Tensor:
+    """Tensor to receive the payload of a tensor item into."""
+
+    dtype, requires_grad, shape = tensor_descriptor
+    return torch.empty(shape, dtype=dtype).requires_grad_(requires_grad)
+
+def msg_type_check(msg: List[Any], expect_msg_type=None) -> List[Any]:
+    if expect_msg_type is not None:
+        if msg[0] == 'Finish':
+            return msg
+        elif msg[0] != expect_msg_type:
+            raise UnexpectedMessageType(
+                "Expected " + expect_msg_type + " but received " + msg[0]
+            )
+    return msg
+
+
 class Communicator(object):
 
 
     def __init__(self, sock=None, ip_address=None):
         self.ip = ip_address
         self.sock = socket.socket() if sock == None else sock
+        self._recv_buffer = bytearray(4096)
+        self.bytes_sent = 0
+        self.bytes_received = 0
 
     def send_msg(self, msg):
-        msg_pickle = pickle.dumps(msg)
-        self.sock.sendall(struct.pack(">I", len(msg_pickle)))
-        self.sock.sendall(msg_pickle)
-        logger.debug(
-            f'[{msg[0]}] sent to {self.sock.getpeername()[0]}:'
-            f'{self.sock.getpeername()[1]}'
-        )
+        self.send_buffers(encode_msg(msg))
+        self._log_msg(msg, "sent to")
+
+    def send_buffers(self, buffers: List[Any]):
+        """Send `buffers` in order with scatter-gather writes.
+
+        `sendmsg` may write only part of the buffers, in which case the
+        remaining bytes are sent by the next call.
+        """
+
+        buffers = [memoryview(buffer).cast("B") for buffer in buffers]
+        buffers = [buffer for buffer in buffers if len(buffer) > 0]
+        while len(buffers) > 0:
+            sent = self.sock.sendmsg(buffers)
+            self.bytes_sent += sent
+            while (len(buffers) > 0) and (sent >= len(buffers[0])):
+                sent -= len(buffers.pop(0))
+            if sent > 0:
+                buffers[0] = buffers[0][sent:]
+
+    def recv_into(self, buffer):
+        """Fill `buffer` with the next bytes of the connection."""
+
+        view = memoryview(buffer).cast("B")
+        received = 0
+        while received < len(view):
+            nbytes = self.sock.recv_into(view[received:])
+            if nbytes == 0:
+                raise ConnectionError("Connection closed by peer")
+            received += nbytes
+        self.bytes_received += received
+
+    def recv_exact(self, nbytes: int) -> memoryview:
+        """Receive exactly `nbytes` into the reusable receive buffer.
+
+        The returned view is only valid until the next receive, and the buffer
+        grows to fit the largest message received so far, up to
+        `RECV_BUFFER_RETAIN` bytes, beyond which a buffer is allocated for the
+        single message.
+        """
+
+        view = self._recv_buffer_view(nbytes)
+        self.recv_into(view)
+        return view
 
     def recv_msg(self, expect_msg_type=None):
-        msg_len = struct.unpack(">I", self.sock.recv(4))[0]
-        msg = self.sock.recv(msg_len, socket.MSG_WAITALL)
-        msg = pickle.loads(msg)
-        logger.debug(
-            f"{msg[0]} received from {self.sock.getpeername()[0]}:" 
-            f"{self.sock.getpeername()[1]}"
+        msg_type_id, nr_items, descriptors_len = HEADER.unpack(
+            self.recv_exact(HEADER.size)
         )
-        if expect_msg_type is not None:
-            if msg[0] == 'Finish':
-                return msg
-            elif msg[0] != expect_msg_type:
-                raise Exception("Expected " + expect_msg_type + " but received " + msg[0])
-        return msg
-
-    def connect(self, conn_tuple: Tuple[str, int]): 
+        msg_type = MESSAGE_TYPES[msg_type_id]
+
+        # the descriptors are parsed before any payload reuses the buffer
+        descriptors = self.recv_exact(descriptors_len)
+        items = decode_descriptors(descriptors, nr_items)
+        descriptors.release()
+
+        msg = [msg_type]
+        for kind, nbytes, tensor_descriptor in items:
+            if kind != ITEM_PICKLE:
+                tensor = tensor_empty(tensor_descriptor)
+                self._recv_payload_into(kind, tensor_bytes(tensor))
+                msg.append(tensor)
+            else:
+                payload = self.recv_exact(nbytes)
+                msg.append(pickle.loads(payload))
+                payload.release()
+
+        self._log_msg(msg, "received from")
+        return msg_type_check(msg, expect_msg_type)
+
+    def _recv_payload_into(self, kind: int, buffer):
+        """Receive the payload of a tensor item of `kind` into `buffer`."""
+
+        self.recv_into(buffer)
+
+    def wait_readable(self, timeout: Optional[float]) -> bool:
+        """Wait for the next message for at most `timeout` seconds, and return
+        whether it has started to arrive. Messages are received whole, so
+        nothing of the next one has been read yet."""
+
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        return len(readable) > 0
+
+    def close(self):
+        self.sock.close()
+
+    def _recv_buffer_view(self, nbytes: int) -> memoryview:
+        """View of `nbytes` of the reusable receive buffer, see `recv_exact`."""
+
+        if nbytes > len(self._recv_buffer):
+            if nbytes > RECV_BUFFER_RETAIN:
+                return memoryview(bytearray(nbytes))
+            self._recv_buffer = bytearray(max(nbytes, 2*len(self._recv_buffer)))
+        return memoryview(self._recv_buffer)[:nbytes]
+
+    def peer(self) -> str:
+        peername = self.sock.getpeername()
+        if isinstance(peername, tuple):
+            return f"{peername[0]}:{peername[1]}"
+        return str(peername)
+
+    def _log_msg(self, msg, action):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[{msg[0]}] {action} {self.peer()}")
+
+    def connect(self, conn_tuple: Tuple[str, int]):
         self.sock.connect(conn_tuple)
+
+
+class AsyncCommunicator(Communicator):
+    """Communicator with coroutine send and receive methods.
+
+    The frames are the same as those of `Communicator`, and are sent and
+    received with the socket operations of the event loop `loop`, such that a
+    single thread serves many connections.
+    """
+
+    def __init__(self, sock, loop: asyncio.AbstractEventLoop):
+        super().__init__(sock=sock)
+        self.sock.setblocking(False)
+        self.loop = loop
+
+    async def send_msg(self, msg):
+        await self.send_buffers(encode_msg(msg))
+        self._log_msg(msg, "sent to")
+
+    async def send_buffers(self, buffers: List[Any]):
+        for buffer in buffers:
+            buffer = memoryview(buffer).cast("B")
+            if len(buffer) > 0:
+                await self.loop.sock_sendall(self.sock, buffer)
+                self.bytes_sent += len(buffer)
+
+    async def recv_into(self, buffer):
+        view = memoryview(buffer).cast("B")
+        received = 0
+        while received < len(view):
+            nbytes = await self.loop.sock_recv_into(self.sock, view[received:])
+            if nbytes == 0:
+                raise ConnectionError("Connection closed by peer")
+            received += nbytes
+        self.bytes_received += received
+
+    async def recv_exact(self, nbytes: int) -> memoryview:
+        view = self._recv_buffer_view(nbytes)
+        await self.recv_into(view)
+        return view
+
+    async def wait_readable(self, timeout: Optional[float]) -> bool:
+        readable = self.loop.create_future()
+        fd = self.sock.fileno()
+        self.loop.add_reader(
+            fd, lambda: readable.done() or readable.set_result(True)
+        )
+        try:
+            return await asyncio.wait_for(readable, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.loop.remove_reader(fd)
+
+    async def recv_msg(self, expect_msg_type=None):
+        msg_type_id, nr_items, descriptors_len = HEADER.unpack(
+            await self.recv_exact(HEADER.size)
+        )
+        msg_type = MESSAGE_TYPES[msg_type_id]
+
+        descriptors = await self.recv_exact(descriptors_len)
+        items = decode_descriptors(descriptors, nr_items)
+        descriptors.release()
+
+        msg = [msg_type]
+        for kind, nbytes, tensor_descriptor in items:
+            if kind != ITEM_PICKLE:
+                tensor = tensor_empty(tensor_descriptor)
+                await self.recv_into(tensor_bytes(tensor))
+                msg.append(tensor)
+            else:
+                payload = await self.recv_exact(nbytes)
+                msg.append(pickle.loads(payload))
+                payload.release()
+
+        self._log_msg(msg, "received from")
+        return msg_type_check(msg, expect_msg_type)
@@ -0,0 +1,103 @@
+import os
+import threading
+import logging
+import time
+
+from typing import List, Optional, OrderedDict, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+LATE_POLICIES = ["drop", "defer"]
+
+
+class RoundDeadlineException(Exception):
+    pass
+
+
+def round_deadline_spec_env() -> str:
+    """Deadline of the rounds requested through the environment."""
+
+    return os.getenv("ROUND_DEADLINE", "off")
+
+
+class RoundDeadline:
+    """Deadline of the training of every round.
+
+    The clients that are still training once `seconds` have passed since the
+    start of the round are cut off: the server answers their next activations
+    with MSG_ROUND_DEADLINE_SERVER_TO_CLIENT instead of gradients, upon which
+    they end their training and go on with the round. Their updates are left
+    out of the `fed_avg` aggregation of the round, and, with the `policy`
+    `defer`, are aggregated in the next round instead of being dropped.
+
+    Clients that stall, and send nothing for `seconds` while the deadline has
+    passed, are cut off without their answer, see `stall_timeout`.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, policy: str = "drop"):
+        self.seconds = seconds
+        self.policy = policy
+        self.round = 0
+        self.start: Optional[float] = None
+        # late updates of the rounds they were trained in, with their weight
+        self._deferred: List[Tuple[int, OrderedDict, float]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.seconds != None
+
+    def round_start(self):
+        self.round += 1
+        self.start = time.time()
+
+    def passed(self) -> bool:
+        return (
+            self.enabled and (self.start != None)
+            and (time.time() - self.start > self.seconds)
+        )
+
+    def stall_timeout(self) -> Optional[float]:
+        """Seconds to wait for the next message of a client before it counts
+        as stalled, or None to wait for as long as it takes."""
+
+        if (not self.enabled) or (self.start == None):
+            return None
+        return max(0.0, self.start + self.seconds - time.time()) + self.seconds
+
+    def late_update(self, state_dict: OrderedDict, weight: float):
+        """Update of a client that was cut off in the current round."""
+
+        if self.policy != "defer":
+            return
+        with self._lock:
+            self._deferred.append((self.round, state_dict, weight))
+
+    def deferred_take(self) -> List[Tuple[OrderedDict, float]]:
+        """Late updates of the previous rounds, which are aggregated in the
+        current one."""
+
+        with self._lock:
+            deferred = [entry for entry in self._deferred if entry[0] < self.round]
+            self._deferred = [
+                entry for entry in self._deferred if entry[0] >= self.round
+            ]
+        return [(state_dict, weight) for _, state_dict, weight in deferred]
+
+
+def round_deadline_create(spec: str) -> RoundDeadline:
+    """Create a round deadline from `off` or `<seconds>[:<policy>]`, e.g.
+    `30:defer`. The policy defaults to `drop`."""
+
+    if spec == "off":
+        return RoundDeadline()
+    seconds, _, policy = spec.partition(":")
+    policy = policy or "drop"
+    try:
+        seconds = float(seconds)
+    except ValueError:
+        raise RoundDeadlineException(f"Unsupported round deadline: {spec}")
+    if (seconds <= 0) or (policy not in LATE_POLICIES):
+        raise RoundDeadlineException(f"Unsupported round deadline: {spec}")
+    return RoundDeadline(seconds, policy)
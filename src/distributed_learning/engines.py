@@ -0,0 +1,24 @@
+from .server import SplitFedServer
+from .async_server import AsyncSplitFedServer
+from .process_server import ProcessSplitFedServer
+from .shared_server import SharedSplitFedServer
+
+
+class UnknownServerEngine(Exception):
+    pass
+
+
+SERVER_ENGINES = {
+    "threads": SplitFedServer,
+    "async": AsyncSplitFedServer,
+    "processes": ProcessSplitFedServer,
+    "shared": SharedSplitFedServer,
+}
+
+def server_create(engine: str, *args, **kwargs) -> SplitFedServer:
+    """Create the split federated server of the `engine` that serves the
+    clients, with the arguments of `SplitFedServer`."""
+
+    if engine not in SERVER_ENGINES:
+        raise UnknownServerEngine(engine)
+    return SERVER_ENGINES[engine](*args, **kwargs)
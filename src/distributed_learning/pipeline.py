@@ -0,0 +1,84 @@
+import os
+import torch
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+PIPELINE_MODES = ["off", "stash", "drain"]
+
+
+class PipelineException(Exception):
+    pass
+
+
+def pipeline_spec_env() -> str:
+    """Pipelining of the client training requested through the environment."""
+
+    return os.getenv("CLIENT_PIPELINE", "off")
+
+
+@dataclass
+class PipelineConfig:
+    """Pipelining of the training iterations of a client.
+
+    Up to `depth` micro-batches are in flight: their activations have been
+    sent, and the client computes the forward pass of the next micro-batch
+    while the server works on them. The `mode` handles the staleness of the
+    weights of the micro-batches in flight:
+
+    - `stash`: the optimizer steps as soon as the gradients of a micro-batch
+      arrive, and the backward pass of every micro-batch uses a stashed copy
+      of the weights of its forward pass, as in PipeDream.
+    - `drain`: the forward passes of `depth` micro-batches use the same
+      weights, and the optimizer steps once on their averaged gradients, after
+      the pipeline has drained.
+    """
+
+    mode: str = "off"
+    depth: int = 1
+
+    @property
+    def enabled(self) -> bool:
+        return (self.mode != "off") and (self.depth > 1)
+
+
+def pipeline_config_create(spec: str) -> PipelineConfig:
+    """Create a pipeline configuration from `<mode>[:<depth>]`, e.g.
+    `stash:4`. The depth defaults to 2."""
+
+    mode, _, depth = spec.partition(":")
+    if mode not in PIPELINE_MODES:
+        raise PipelineException(f"Unsupported pipeline: {spec}")
+    try:
+        depth = int(depth) if depth != "" else 2
+    except ValueError:
+        raise PipelineException(f"Unsupported pipeline: {spec}")
+    if depth < 1:
+        raise PipelineException(f"Unsupported pipeline: {spec}")
+    return PipelineConfig(mode, depth)
+
+
+@dataclass
+class MicroBatch:
+    outputs: torch.Tensor
+    # weights of the forward pass, in stash mode
+    stashed: Optional[Dict[str, torch.Tensor]] = None
+
+
+def stash_forward(neural_network: torch.nn.Module, inputs) -> MicroBatch:
+    """Forward pass with a copy of the weights, which the optimizer steps do
+    not modify before the backward pass."""
+
+    stashed = {
+        name: parameter.detach().clone().requires_grad_()
+        for name, parameter in neural_network.named_parameters()
+    }
+    outputs = torch.func.functional_call(neural_network, stashed, (inputs,))
+    return MicroBatch(outputs, stashed)
+
+def stash_gradients_apply(neural_network: torch.nn.Module, micro_batch: MicroBatch):
+    """Set the gradients of the stashed weights as those of the weights."""
+
+    for name, parameter in neural_network.named_parameters():
+        parameter.grad = micro_batch.stashed[name].grad
@@ -0,0 +1,234 @@
+import collections
+import traceback
+import logging
+import math
+import torch
+import torch.multiprocessing as mp
+
+from typing import Any, Dict, List, OrderedDict, Tuple
+
+from . import utils
+from .server import SplitFedServer, SplitFedServerThread
+
+
+logger = logging.getLogger(__name__)
+
+# dtype and shape of a tensor at the start of a slab
+TensorSpec = Tuple[torch.dtype, Tuple[int, ...]]
+
+
+class ServerModelWorkerException(Exception):
+    pass
+
+
+def slab_view(slab: torch.Tensor, spec: TensorSpec) -> torch.Tensor:
+    """Tensor of `spec` backed by the start of the byte slab `slab`."""
+
+    dtype, shape = spec
+    nbytes = math.prod(shape)*torch.empty((), dtype=dtype).element_size()
+    return slab[:nbytes].view(dtype).view(shape)
+
+
+class ServerModelProcess:
+    """Server side model and optimizer of a client, in its worker process.
+
+    The activations, labels and gradients of the training steps are exchanged
+    through byte slabs in shared memory, which the main process allocates and
+    hands over once, and the commands only carry their dtype and shape.
+    """
+
+    def __init__(self, neural_network, cls_optimizer, criterion):
+        self.neural_network = neural_network
+        self.cls_optimizer = cls_optimizer
+        self.criterion = criterion
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.slabs: Dict[str, torch.Tensor] = {}
+
+    def optimizer(self, args, kwargs):
+        self.neural_network.to(self.device)
+        self._optimizer = self.cls_optimizer(
+            self.neural_network.parameters(), *args, **kwargs
+        )
+
+    def slabs_set(self, slabs: Dict[str, torch.Tensor]):
+        self.slabs.update(slabs)
+
+    def train_step(self, inputs_spec: TensorSpec, targets_spec: TensorSpec):
+        """Train on the activations of the inputs slab, and write the
+        gradients of the activations into the gradients slab."""
+
+        inputs = slab_view(self.slabs["inputs"], inputs_spec)
+        inputs = inputs.to(self.device).detach().requires_grad_()
+        targets = slab_view(self.slabs["targets"], targets_spec).to(self.device)
+        self.neural_network.train()
+        self._optimizer.zero_grad()
+        outputs = self.neural_network(inputs)
+        loss = self.criterion(outputs, targets)
+        loss.backward()
+        self._optimizer.step()
+        slab_view(self.slabs["gradients"], inputs_spec).copy_(inputs.grad)
+
+    def validate_step(self, inputs_spec: TensorSpec):
+        inputs = slab_view(self.slabs["inputs"], inputs_spec).to(self.device)
+        self.neural_network.eval()
+        with torch.no_grad():
+            outputs = self.neural_network(inputs)
+        return outputs.cpu().numpy()
+
+    def state_dict(self) -> OrderedDict:
+        # copies, as the tensors are moved to shared memory to be sent
+        return collections.OrderedDict(
+            (key, tensor.detach().cpu().clone())
+            for key, tensor in self.neural_network.state_dict().items()
+        )
+
+    def load_state_dict(self, state_dict: OrderedDict):
+        self.neural_network.load_state_dict(state_dict)
+
+
+def _server_model_worker(conn, server_model: ServerModelProcess, num_threads):
+    torch.set_num_threads(num_threads)
+    while True:
+        command, args = conn.recv()
+        if command == "stop":
+            return
+        try:
+            conn.send((True, getattr(server_model, command)(*args)))
+        except Exception:
+            conn.send((False, traceback.format_exc()))
+
+
+class ServerModelWorker:
+    """Handle of the worker process of a server side model.
+
+    The worker runs the methods of a `ServerModelProcess`, one command at a
+    time, and its forward and backward passes use `num_threads` intra-op
+    threads, such that each worker keeps to its own cores.
+    """
+
+    def __init__(self, neural_network, cls_optimizer, criterion, num_threads=1):
+        context = mp.get_context("spawn")
+        self.conn, conn_worker = context.Pipe()
+        self.process = context.Process(
+            target=_server_model_worker,
+            args=(
+                conn_worker,
+                ServerModelProcess(neural_network, cls_optimizer, criterion),
+                num_threads,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+        conn_worker.close()
+        self.slabs: Dict[str, torch.Tensor] = {}
+
+    def call(self, command: str, *args) -> Any:
+        self.conn.send((command, args))
+        succeeded, result = self.conn.recv()
+        if not succeeded:
+            raise ServerModelWorkerException(result)
+        return result
+
+    def slab_reserve(self, name: str, nbytes: int):
+        """Ensure the slab `name` holds at least `nbytes`.
+
+        A slab that is too small is replaced by one twice the size, which is
+        handed over to the worker.
+        """
+
+        slab = self.slabs.get(name)
+        if (slab != None) and (slab.numel() >= nbytes):
+            return
+        size = nbytes if slab == None else max(nbytes, 2*slab.numel())
+        self.slabs[name] = torch.empty(size, dtype=torch.uint8).share_memory_()
+        self.call("slabs_set", {name: self.slabs[name]})
+
+    def slab_write(self, name: str, tensor: torch.Tensor) -> TensorSpec:
+        tensor = tensor.detach()
+        self.slab_reserve(name, tensor.nbytes)
+        spec = (tensor.dtype, tuple(tensor.shape))
+        slab_view(self.slabs[name], spec).copy_(tensor)
+        return spec
+
+    def slab_view(self, name: str, spec: TensorSpec) -> torch.Tensor:
+        return slab_view(self.slabs[name], spec)
+
+    def stop(self):
+        if self.process.is_alive():
+            self.conn.send(("stop", ()))
+            self.process.join()
+
+
+class ProcessSplitFedServerThread(SplitFedServerThread):
+    """Client thread whose server side model lives in a worker process.
+
+    The thread still exchanges the messages with the client, but the forward
+    and backward passes, and the optimizer, run in the worker, out of reach of
+    the GIL of the server. `neural_network` only serves as the template of the
+    server side weights.
+    """
+
+    worker: ServerModelWorker
+
+    def __init__(self, comm, neural_network, cls_optimizer, criterion):
+        super().__init__(comm, neural_network, cls_optimizer, criterion)
+        self.worker = ServerModelWorker(neural_network, cls_optimizer, criterion)
+
+    def optimizer(self, *args, **kwargs):
+        self.worker.call("optimizer", args, kwargs)
+
+    def _train_step(self, msg):
+        smashed_layers, labels = self._activations_decode(msg)
+        self.inputs_total += smashed_layers.size()[0]
+        inputs_spec = self.worker.slab_write("inputs", smashed_layers)
+        targets_spec = self.worker.slab_write("targets", labels)
+        self.worker.slab_reserve("gradients", smashed_layers.nbytes)
+        self.worker.call("train_step", inputs_spec, targets_spec)
+        # the message is sent before the next step overwrites the slab
+        gradients = self.worker.slab_view("gradients", inputs_spec)
+        return [
+            'MSG_SERVER_GRADIENTS_SERVER_TO_CLIENT',
+            *self.codec_gradients.encode(gradients),
+        ]
+
+    def _validate_step(self, msg):
+        smashed_layers, labels = self._activations_decode(msg)
+        inputs_spec = self.worker.slab_write("inputs", smashed_layers)
+        outputs = torch.from_numpy(self.worker.call("validate_step", inputs_spec))
+        self.outputs_validate = torch.cat((self.outputs_validate, outputs), 0)
+        self.targets_validate = torch.cat((self.targets_validate, labels), 0)
+
+    def server_state_dict(self) -> OrderedDict:
+        return self.worker.call("state_dict")
+
+    def close(self):
+        super().close()
+        self.worker.stop()
+
+    def neural_network_load_server(self, nn_unit):
+        server_weights = utils.split_weights_server(
+            nn_unit.state_dict(), self.neural_network.state_dict()
+        )
+        self.worker.call("load_state_dict", server_weights)
+
+
+class ProcessSplitFedServer(SplitFedServer):
+    """Split federated server with the server side models in worker processes.
+
+    Each client gets a worker process, see `ProcessSplitFedServerThread`, so
+    the server side computation of the clients scales with the cores, while
+    the main process only orchestrates the clients and aggregates the models.
+    """
+
+    cls_thread = ProcessSplitFedServerThread
+
+    @SplitFedServer.stop_server.setter
+    def stop_server(self, value: bool):
+        SplitFedServer.stop_server.fset(self, value)
+        if value:
+            with self.pending_lock:
+                client_threads: List[ProcessSplitFedServerThread] = [
+                    *self.threads, *self.pending_clients
+                ]
+            for client_thread in client_threads:
+                client_thread.worker.stop()
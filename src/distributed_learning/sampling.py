@@ -0,0 +1,110 @@
+import os
+import statistics
+import numpy as np
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, TypeVar, Union
+
+
+SAMPLING_STRATEGIES = ["all", "uniform", "weighted", "throughput"]
+
+Client = TypeVar("Client")
+
+
+class ClientSamplingException(Exception):
+    pass
+
+
+def client_sampling_spec_env() -> str:
+    """Sampling of the clients of the rounds requested through the
+    environment."""
+
+    return os.getenv("CLIENT_SAMPLING", "all")
+
+
+@dataclass
+class ClientSampling:
+    """Selection of the clients that take part in a round.
+
+    The `strategy` picks the clients:
+
+    - `all`: every connected client.
+    - `uniform`: uniformly at random.
+    - `weighted`: at random, in proportion to the inputs each client trained
+      on in its last round.
+    - `throughput`: at random, in proportion to the inputs per second of the
+      last round of each client.
+
+    Clients that have no measure yet, as they have not trained, count as the
+    average client for `weighted`, and as the fastest one for `throughput`,
+    such that they get measured. The number of clients is `amount` if it is
+    an int, that fraction of the connected clients, and at least one, if it
+    is a float, and all the clients if it is None.
+    """
+
+    strategy: str = "all"
+    amount: Optional[Union[int, float]] = None
+
+    def count(self, nr_clients: int) -> int:
+        if (self.strategy == "all") or (self.amount == None):
+            return nr_clients
+        if isinstance(self.amount, int):
+            return min(self.amount, nr_clients)
+        return min(max(1, round(self.amount*nr_clients)), nr_clients)
+
+    def select(self, clients: Sequence[Client]) -> List[Client]:
+        """Clients of the round, in the order of `clients`."""
+
+        count = self.count(len(clients))
+        if count >= len(clients):
+            return list(clients)
+        probabilities = None
+        if self.strategy in ("weighted", "throughput"):
+            weights = self._weights(clients)
+            probabilities = weights/weights.sum()
+        selected = np.random.choice(
+            len(clients), count, replace=False, p=probabilities
+        )
+        return [clients[i] for i in sorted(selected)]
+
+    def _measure(self, client) -> Optional[float]:
+        if client.rounds_completed == 0:
+            return None
+        if self.strategy == "weighted":
+            return client.inputs_total
+        return client.throughput
+
+    def _weights(self, clients: Sequence[Client]) -> np.ndarray:
+        measures = [self._measure(client) for client in clients]
+        known = [measure for measure in measures if (measure != None) and (measure > 0)]
+        default = 1.0
+        if len(known) > 0:
+            default = max(known) if self.strategy == "throughput" else statistics.mean(known)
+        return np.array([
+            measure if (measure != None) and (measure > 0) else default
+            for measure in measures
+        ], dtype=float)
+
+
+def client_sampling_create(spec: str) -> ClientSampling:
+    """Create a client sampling from `<strategy>[:<amount>]`, where the
+    amount is a number of clients, e.g. `throughput:20`, or a fraction of
+    them, e.g. `uniform:0.1`. The amount defaults to all the clients."""
+
+    strategy, _, amount = spec.partition(":")
+    if strategy not in SAMPLING_STRATEGIES:
+        raise ClientSamplingException(f"Unsupported client sampling: {spec}")
+    if amount == "":
+        return ClientSampling(strategy)
+    try:
+        amount = int(amount)
+        valid = amount >= 1
+    except ValueError:
+        try:
+            amount = float(amount)
+        except ValueError:
+            raise ClientSamplingException(f"Unsupported client sampling: {spec}")
+        valid = 0 < amount <= 1
+    if not valid:
+        raise ClientSamplingException(f"Unsupported client sampling: {spec}")
+    return ClientSampling(strategy, amount)
@@ -18,8 +18,16 @@ from typing import (
 from functools import partial
 from dataclasses import dataclass
 
-from .communicator import Communicator
+from .communicator import Communicator, encode_msg, msg_type_check
+from .transports import Listener, listener_create, transport_env
 from . import utils
+from . import aggregation
+from . import codecs
+from .weight_sync import (
+    WeightSync, GlobalWeightsBroadcast, weight_sync_spec_env
+)
+from .deadline import RoundDeadline, round_deadline_create, round_deadline_spec_env
+from .sampling import client_sampling_create, client_sampling_spec_env
 
 
 logging.basicConfig(level = logging.INFO,format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -38,6 +46,14 @@ class ThreadValidationException(Exception):
     pass
 
 
+class ClientStalledException(Exception): 
+    pass
+
+
+class StreamingAggregationException(Exception): 
+    pass
+
+
 class ValidateModelState:
 
 
@@ -218,8 +234,23 @@ class SplitFedServerThread:
 
     comm: Communicator
     _optimizer: torch.optim.Optimizer
+    codec_activations: codecs.Codec
+    codec_gradients: codecs.Codec
+    weight_sync: WeightSync
     _validate_model_state: Optional[ValidateModelState]
     _unit_state_dict: Optional[OrderedDict]
+    # training rounds the client has completed
+    rounds_completed: int
+    # global version of the weights the client trains from
+    base_version: int
+    round_deadline: Optional[RoundDeadline]
+    # inputs per second of the last round
+    throughput: Optional[float]
+    # whether the training of the last round was cut off at its deadline
+    cut_off: bool
+    # whether the client stalled past its deadline, and was disconnected
+    stalled: bool
+    training_end: Optional[float]
 
     def __init__(
         self, comm, neural_network, cls_optimizer, criterion,
@@ -232,12 +263,40 @@ class SplitFedServerThread:
         self._loss_validation = None
         self._validate_model_state = None
         self._unit_state_dict = None
+        self.weight_sync = WeightSync(weight_sync_spec_env())
+        self.rounds_completed = 0
+        self.base_version = 0
+        self.inputs_total = 0
+        self.throughput = None
+        self.round_deadline = None
+        self.cut_off = False
+        self.stalled = False
+        self.training_end = None
          
     def optimizer(self, *args, **kwargs): 
         self._optimizer = self.cls_optimizer(
             self.neural_network.parameters(), *args, **kwargs
         )
 
+    def codecs_negotiate(self): 
+        _, requested = self.comm.recv_msg(
+            expect_msg_type='MSG_CODECS_CLIENT_TO_SERVER'
+        )
+        accepted = self._codecs_accept(requested)
+        self.comm.send_msg(['MSG_CODECS_SERVER_TO_CLIENT', accepted])
+
+    def _codecs_accept(self, requested): 
+        accepted = codecs.codec_specs_negotiate(requested)
+        logger.info(f"Split layer codecs: {accepted}")
+        self.codec_activations = codecs.codec_create(accepted["activations"])
+        self.codec_gradients = codecs.codec_create(accepted["gradients"])
+        return accepted
+
+    def _activations_decode(self, msg): 
+        """Split layer activations and labels of an activations message."""
+
+        return self.codec_activations.decode(msg[1:-1]), msg[-1]
+
     @property
     def validate_model_state(self): 
         if self._validate_model_state == None: 
@@ -257,32 +316,118 @@ class SplitFedServerThread:
         return self._loss_validation
 
     def train_offloading(self):
+        try: 
+            self._train_offloading()
+        except ClientStalledException: 
+            self._stalled_cut_off()
+
+    def _train_offloading(self):
         self._loss_validation = None
         self._unit_state_dict = None
+        self.training_end = None
         self.neural_network.train()
-        _, iterations_number = self.comm.recv_msg(
+        _, iterations_number = self._recv_in_round(
             expect_msg_type='CLIENT_TRAINING_ITERATIONS_NUMBER'
         )
         logger.debug(f"Number training iterations: {iterations_number}")
+        training_start = time.time()
         self.inputs_total = 0
+        self.cut_off = False
+        training_time = None
+        s_bytes = self.comm.bytes_sent + self.comm.bytes_received
         for i in tqdm.tqdm(range(iterations_number)):
-            msg = self.comm.recv_msg('MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER')
-            smashed_layers = msg[1]
-            labels = msg[2]
+            msg = self._recv_in_round('MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER')
+            if self._deadline_passed(): 
+                self.comm.send_msg(['MSG_ROUND_DEADLINE_SERVER_TO_CLIENT'])
+                training_time = self._train_cut_off()
+                break
+            self.comm.send_msg(self._train_step(msg))
+        self._log_bytes_per_iteration(s_bytes, iterations_number)
+        if training_time == None: 
+            training_time = self._recv_in_round(
+                expect_msg_type='MSG_TRAINING_TIME_PER_ITERATION'
+            )
+        self.training_end = time.time()
+        self.throughput = self.inputs_total/max(self.training_end - training_start, 1e-9)
+        self.rounds_completed += 1
 
-            inputs, targets = smashed_layers.to(self.device), labels.to(self.device)
-            self.inputs_total += inputs.size()[0]
-            self._optimizer.zero_grad()
-            outputs = self.neural_network(inputs)
-            loss = self.criterion(outputs, targets)
-            loss.backward()
-            self._optimizer.step()
-
-            msg = ['MSG_SERVER_GRADIENTS_SERVER_TO_CLIENT', inputs.grad]
-            self.comm.send_msg(msg)
-        training_time = self.comm.recv_msg(
-            expect_msg_type='MSG_TRAINING_TIME_PER_ITERATION'
-        )
+    def round_start(
+        self, selected: bool = True,
+        broadcast: Optional[GlobalWeightsBroadcast] = None,
+    ): 
+        """Start a round on the client, which sits it out unless `selected`,
+        and first gets the global weights of `broadcast`, if any."""
+
+        self.comm.send_msg([
+            'MSG_ROUND_START_SERVER_TO_CLIENT', selected, broadcast != None
+        ])
+        if broadcast != None: 
+            self.neural_network_load_client(broadcast)
+
+    def _deadline_passed(self) -> bool: 
+        return (self.round_deadline != None) and self.round_deadline.passed()
+
+    def _recv_in_round(self, expect_msg_type=None): 
+        """Receive the next message of the client in the round, unless the
+        client stalls past the deadline of the round, see
+        `RoundDeadline.stall_timeout`."""
+
+        timeout = None
+        if self.round_deadline != None: 
+            timeout = self.round_deadline.stall_timeout()
+        if (timeout != None) and (not self.comm.wait_readable(timeout)): 
+            raise ClientStalledException(f"Client {self.comm.ip} stalled")
+        return self.comm.recv_msg(expect_msg_type)
+
+    def _stalled_cut_off(self): 
+        """Cut off a client that stalled. The exchange with the client can
+        not go on from the middle of the round, so it is disconnected."""
+
+        logger.warning(f"Client {self.comm.ip} stalled past the deadline, disconnecting")
+        self.cut_off = True
+        self.stalled = True
+        self.close()
+
+    def close(self): 
+        self.comm.close()
+
+    def _train_cut_off(self): 
+        """Answer the activations still in flight after the deadline message
+        with deadline messages too, up to the end of the training of the
+        client, and return its training time message."""
+
+        self.cut_off = True
+        msg = self._recv_in_round()
+        while msg[0] == 'MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER': 
+            self.comm.send_msg(['MSG_ROUND_DEADLINE_SERVER_TO_CLIENT'])
+            msg = self._recv_in_round()
+        return msg_type_check(msg, 'MSG_TRAINING_TIME_PER_ITERATION')
+
+    def _train_step(self, msg): 
+        """Train the server side on an activations message, and return the
+        gradients message."""
+
+        smashed_layers, labels = self._activations_decode(msg)
+        inputs = smashed_layers.detach().to(self.device).requires_grad_()
+        targets = labels.to(self.device)
+        self.inputs_total += inputs.size()[0]
+        self._optimizer.zero_grad()
+        outputs = self.neural_network(inputs)
+        loss = self.criterion(outputs, targets)
+        loss.backward()
+        self._optimizer.step()
+        return [
+            'MSG_SERVER_GRADIENTS_SERVER_TO_CLIENT',
+            *self.codec_gradients.encode(inputs.grad.cpu()),
+        ]
+
+    def _log_bytes_per_iteration(self, s_bytes, iterations_number): 
+        e_bytes = self.comm.bytes_sent + self.comm.bytes_received
+        if iterations_number > 0: 
+            logger.info(
+                "Bytes per iteration: "
+                f"{(e_bytes - s_bytes)/iterations_number}"
+            )
 
     @property
     def unit_state_dict(self) -> OrderedDict: 
@@ -290,16 +435,74 @@ class SplitFedServerThread:
             raise Exception()
         return self._unit_state_dict
 
-    def neural_network_unit_compose(self, neural_network_unit): 
-        _, weights_client = self.comm.recv_msg(
-            expect_msg_type='MSG_LOCAL_WEIGHTS_CLIENT_TO_SERVER'
-        )
-        self._unit_state_dict = utils.concat_weights(
+    def neural_network_unit_compose(
+        self, neural_network_unit,
+        flat_aggregation: Optional[aggregation.FlatAggregation] = None,
+    ): 
+        try: 
+            msg = self._recv_in_round(
+                expect_msg_type='MSG_LOCAL_WEIGHTS_CLIENT_TO_SERVER'
+            )
+        except ClientStalledException: 
+            self._stalled_cut_off()
+            return None
+        return self._unit_compose(neural_network_unit, msg, flat_aggregation)
+
+    def _unit_compose(self, neural_network_unit, msg, flat_aggregation=None): 
+        self._unit_state_dict = self._unit_concat(neural_network_unit, msg)
+        if flat_aggregation != None: 
+            flat_aggregation.add(self._unit_state_dict)
+        return self._unit_state_dict
+
+    def _unit_concat(self, neural_network_unit, msg) -> OrderedDict: 
+        weights_client = self.weight_sync.decode_local(msg[1:])
+        return utils.concat_weights(
             neural_network_unit.state_dict(),
             weights_client,
-            self.neural_network.state_dict(),
+            self.server_state_dict(),
         )
-        return self._unit_state_dict
+
+    def neural_network_unit_fold(
+        self, neural_network_unit,
+        streaming_aggregation: aggregation.StreamingAggregation,
+    ): 
+        """Receive the unit weights of the client, and fold them into the
+        running average of the round, weighted by the inputs the client
+        trained on. Unlike `neural_network_unit_compose`, the unit weights are
+        not kept."""
+
+        try: 
+            msg = self._recv_in_round(
+                expect_msg_type='MSG_LOCAL_WEIGHTS_CLIENT_TO_SERVER'
+            )
+        except ClientStalledException: 
+            self._stalled_cut_off()
+            return
+        self._unit_fold(neural_network_unit, msg, streaming_aggregation)
+
+    def _unit_fold(self, neural_network_unit, msg, streaming_aggregation): 
+        unit_state_dict = self._unit_concat(neural_network_unit, msg)
+        if self.cut_off: 
+            # left out of the aggregation of the round
+            self.round_deadline.late_update(unit_state_dict, self.inputs_total)
+        else: 
+            streaming_aggregation.add(unit_state_dict, self.inputs_total)
+
+    def train_offloading_fold(
+        self, neural_network_unit,
+        streaming_aggregation: aggregation.StreamingAggregation,
+    ): 
+        """Train, then fold the unit weights the client uploads right after
+        its training, see `neural_network_unit_fold`."""
+
+        self.train_offloading()
+        if not self.stalled: 
+            self.neural_network_unit_fold(neural_network_unit, streaming_aggregation)
+
+    def server_state_dict(self) -> OrderedDict: 
+        """Weights of the server side model."""
+
+        return self.neural_network.state_dict()
 
     def neural_network_load_server(self, nn_unit): 
         server_weights = utils.split_weights_server(
@@ -307,11 +510,9 @@ class SplitFedServerThread:
         )
         self.neural_network.load_state_dict(server_weights)
 
-    def neural_network_load_client(self, nn_unit):
-        msg = [
-            'MSG_INITIAL_GLOBAL_WEIGHTS_SERVER_TO_CLIENT', nn_unit
-        ]
-        self.comm.send_msg(msg)
+    def neural_network_load_client(self, broadcast: GlobalWeightsBroadcast):
+        self.comm.send_buffers(broadcast.buffers(self.weight_sync))
+        self.base_version = broadcast.version
 
     def validate_model(self, validate_model_state): 
         self.comm.send_msg([
@@ -326,10 +527,20 @@ class SplitFedServerThread:
             expect_msg_type='MODEL_VALIDATION_RESULT'
         )
 
-    def validate_models(self, validate_models: CollectionValidateModelState): 
-        self.comm.send_msg([
-            "MODELS_TO_VALIDATE", validate_models.models_to_validate()
-        ])
+    def validate_models(
+        self, validate_models: CollectionValidateModelState, buffers=None
+    ): 
+        """Validate the models of `validate_models` on the client.
+
+        `buffers` holds the encoded MODELS_TO_VALIDATE message, if it has
+        already been encoded for all the clients.
+        """
+
+        if buffers == None: 
+            buffers = encode_msg([
+                "MODELS_TO_VALIDATE", validate_models.models_to_validate()
+            ])
+        self.comm.send_buffers(buffers)
         _, batch_num = self.comm.recv_msg(
             expect_msg_type="MODELS_VALIDATION_ITERATIONS_NUMBER"
         )
@@ -346,43 +557,56 @@ class SplitFedServerThread:
             expect_msg_type='CLIENT_VALIDATION_ITERATIONS_NUMBER'
         )
         logger.debug(f"Number validation iterations: {iterations_number}")
+        self._validate_start()
+        for i in tqdm.tqdm(range(iterations_number)):
+            msg = self.comm.recv_msg('MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER')
+            self._validate_step(msg)
+
+    def _validate_start(self): 
         self.neural_network.eval()
         self.outputs_validate = torch.tensor([])
         self.targets_validate = torch.tensor([])
+
+    def _validate_step(self, msg): 
+        smashed_layers, labels = self._activations_decode(msg)
+        inputs, targets = smashed_layers.to(self.device), labels.to(self.device)
         with torch.no_grad(): 
-            for i in tqdm.tqdm(range(iterations_number)):
-                msg = self.comm.recv_msg('MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER')
-                smashed_layers = msg[1]
-                labels = msg[2]
-                inputs, targets = smashed_layers.to(self.device), labels.to(self.device)
-                outputs = self.neural_network(inputs)
-                self.outputs_validate = torch.cat((self.outputs_validate, outputs), 0)
-                self.targets_validate = torch.cat((self.targets_validate, targets), 0)
+            outputs = self.neural_network(inputs)
+        self.outputs_validate = torch.cat((self.outputs_validate, outputs), 0)
+        self.targets_validate = torch.cat((self.targets_validate, targets), 0)
 
 
 class SplitFedServer: 
 
 
-    sock: socket.socket
+    listener: Listener
     threads: List[SplitFedServerThread]
+    round_threads: List[SplitFedServerThread]
     pending_clients: List[SplitFedServerThread]
     pending_lock: threading.Lock
     cls_optimizer: Type[torch.optim.Optimizer]
     struct_optimizer_constructor: StructOptimizerConstructor
     thread_listen: threading.Thread
     thread_train: threading.Thread
+    # whether the unit weights of a client can be folded into the average as
+    # soon as the client is done training, while the others still train
+    fold_during_training = True
+    cls_thread: Type[SplitFedServerThread] = SplitFedServerThread
 
     def __init__(
         self, ip_address, server_port, neural_network_unit, 
         cls_optimizer: Type[torch.optim.Optimizer], criterion,
-        nn_server_creator, split_layer
+        nn_server_creator, split_layer, transport: Optional[str] = None,
+        round_deadline_spec: Optional[str] = None,
+        client_sampling_spec: Optional[str] = None,
     ): 
-        self.sock = socket.socket()
-        self.sock.bind((ip_address, server_port))
-        self.sock.settimeout(5)
+        self.transport = transport if transport != None else transport_env()
+        self.listener = listener_create(self.transport, ip_address, server_port)
         self.neural_network_unit = neural_network_unit
         self.cls_optimizer = cls_optimizer
         self.threads = []
+        # clients of the current round
+        self.round_threads = []
         self.pending_clients = []
         self.pending_lock = threading.Lock()
         self._stop_server = False
@@ -391,6 +615,19 @@ class SplitFedServer:
         self.nn_server_creator = nn_server_creator
         self.split_layer = split_layer
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.global_version = 0
+        # broadcast of the global weights of `global_version`
+        self._broadcast: Optional[GlobalWeightsBroadcast] = None
+        self.flat_aggregation: Optional[aggregation.FlatAggregation] = None
+        self.streaming_aggregation: Optional[aggregation.StreamingAggregation] = None
+        self.round_deadline = round_deadline_create(
+            round_deadline_spec if round_deadline_spec != None
+            else round_deadline_spec_env()
+        )
+        self.client_sampling = client_sampling_create(
+            client_sampling_spec if client_sampling_spec != None
+            else client_sampling_spec_env()
+        )
 
     def optimizer(self, *args, **kwargs): 
         self.struct_optimizer_constructor = StructOptimizerConstructor(
@@ -398,7 +635,13 @@ class SplitFedServer:
         )
 
     def create_thread(self, comm): 
-        thread_sf = SplitFedServerThread(
+        thread_sf = self._thread_create(comm)
+        thread_sf.codecs_negotiate()
+        with self.pending_lock:
+            self.pending_clients.append(thread_sf)
+
+    def _thread_create(self, comm) -> SplitFedServerThread: 
+        thread_sf = self.cls_thread(
             comm, self.nn_server_creator(self.split_layer),
             self.cls_optimizer, self.criterion
         )
@@ -406,22 +649,20 @@ class SplitFedServer:
             *self.struct_optimizer_constructor.args,
             **self.struct_optimizer_constructor.kwargs,
         )
-        with self.pending_lock:
-            self.pending_clients.append(thread_sf)
+        return thread_sf
 
     def _listen(self): 
         logger.info("Ready to connect")
 
         while True:
             if self.stop_server:
+                self.listener.close()
                 return
-            try: 
-                self.sock.listen(5)
-                (sock, (ip, _)) = self.sock.accept()
-                logger.info(f'Client connected: {ip}')
-                self.create_thread(Communicator(sock=sock))
-            except socket.timeout: 
+            comm = self.listener.accept()
+            if comm == None: 
                 continue
+            logger.info(f'Client connected: {comm.ip}')
+            self.create_thread(comm)
 
 
     @property
@@ -444,30 +685,148 @@ class SplitFedServer:
         )
         self.thread_listen.start()
 
-    def _train(self): 
-        threads_training = [
+    def _run_clients(self, name, calls): 
+        """Run the `(method, args)` calls of client threads concurrently.
+
+        Each call runs in its own thread, and the method returns once all of
+        them are done.
+        """
+
+        threads = [
             threading.Thread(
-                target=t.train_offloading, 
-                name=f"thread_training_{i}"
-            ) 
-            for i, t in enumerate(self.threads)
+                target=method, args=args, name=f"thread_{name}_{i}"
+            )
+            for i, (method, args) in enumerate(calls)
         ]
-        logger.debug("Start threads training")
-        for t in threads_training: 
+        for t in threads: 
             t.start()
-        for t in threads_training: 
+        for t in threads: 
             t.join()
+
+    def _train(self): 
+        logger.debug("Start threads training")
+        self.round_deadline.round_start()
+        for t in self.round_threads: 
+            t.round_deadline = self.round_deadline
+        self._round_start()
+        if self.streaming_aggregation != None: 
+            calls = [
+                (
+                    t.train_offloading_fold,
+                    (self.neural_network_unit, self.streaming_aggregation),
+                )
+                for t in self.round_threads
+            ]
+        else: 
+            calls = [(t.train_offloading, ()) for t in self.round_threads]
+        self._run_clients("training", calls)
+        self._log_completion_times()
+        self._stalled_drop()
         logger.debug("End threads training")
 
-    def train(self, min_clients=1):
+    def _round_start(self): 
+        """Start the round on every client, such that the clients keep count
+        of the rounds, also of those they sit out.
+
+        The clients of the round that sat out the rounds since they last got
+        the global weights get the current ones first.
+        """
+
+        stale_threads = [
+            t for t in self.round_threads if t.base_version != self.global_version
+        ]
+        broadcast = None
+        if len(stale_threads) > 0: 
+            broadcast = self._global_broadcast(stale_threads[0])
+        self._run_clients("round_start", [
+            (
+                t.round_start,
+                (True, broadcast if t in stale_threads else None)
+                if t in self.round_threads else (False, None),
+            )
+            for t in self.threads
+        ])
+
+    def _log_completion_times(self): 
+        """Log the time every client took to train in the round, to tune its
+        deadline."""
+
+        for t in self.round_threads: 
+            if t.training_end == None: 
+                continue
+            i = self.threads.index(t)
+            completion_time = t.training_end - self.round_deadline.start
+            cut_off = ", cut off at the deadline" if t.cut_off else ""
+            logger.info(
+                f"Client {i} ({t.comm.ip}) completed its training in "
+                f"{completion_time:.3f}s{cut_off}"
+            )
+
+    def _stalled_drop(self): 
+        """Drop the clients that stalled, and were disconnected, from the
+        round and from the connected clients."""
+
+        stalled = [t for t in self.round_threads if t.stalled]
+        if len(stalled) == 0: 
+            return
+        logger.warning(
+            f"Dropped the stalled clients {[self.threads.index(t) for t in stalled]}"
+        )
+        self.threads = [t for t in self.threads if not t.stalled]
+        self.round_threads = [t for t in self.round_threads if not t.stalled]
+
+    def _round_candidates(self) -> List[int]: 
+        """Positions, in the round, of the clients whose models are candidates
+        for the aggregation: those that were not cut off at the deadline, or
+        every client if none met it."""
+
+        candidates = [
+            i for i, t in enumerate(self.round_threads) if not t.cut_off
+        ]
+        if len(candidates) == 0: 
+            logger.warning("No client met the deadline, all the models are candidates")
+            return list(range(len(self.round_threads)))
+        return candidates
+
+    def _clients_wait(self, min_clients): 
+        """Add the pending clients, until at least `min_clients` are
+        connected."""
+
         self._add_pending_clients()
         while (len(self.threads) < min_clients) and (not self.stop_server): 
             logger.info("Not enough clients connected")
             self._add_pending_clients()
             time.sleep(2)
+
+    def train(self, min_clients=1, aggregation_method=None):
+        """Train a round with the connected clients.
+
+        If the round is to be aggregated with `fed_avg`, the unit weights of
+        every client are folded into the average as soon as the client
+        uploads them, at the end of its training, such that the aggregation
+        only waits for the last client.
+        """
+
+        self._clients_wait(min_clients)
+        self.round_threads = self.client_sampling.select(self.threads)
+        if len(self.round_threads) < len(self.threads): 
+            logger.info(
+                "Round clients: "
+                f"{[self.threads.index(t) for t in self.round_threads]} "
+                f"of {len(self.threads)}"
+            )
+        self.streaming_aggregation = None
+        if (aggregation_method == "fed_avg") and self.fold_during_training: 
+            self.streaming_aggregation = aggregation.StreamingAggregation(
+                self.neural_network_unit.state_dict()
+            )
         return self._train()
     
     def aggregate(self, method): 
+        if (self.streaming_aggregation != None) and (method != "fed_avg"): 
+            raise StreamingAggregationException(
+                f"The round was trained to be aggregated with fed_avg, not {method}"
+            )
         if method == "fed_avg": 
             self.fed_avg()
         elif method == "best_validation_model":
@@ -481,7 +840,8 @@ class SplitFedServer:
         else: 
             raise NotImplementedError(method)
         self._nn_threads_update()
-        self._weights_nn_unit_send(self.threads)
+        self.global_version += 1
+        self._weights_nn_unit_send(self.round_threads)
 
     def _nn_threads_update(self): 
         for thread in self.threads: 
@@ -495,33 +855,84 @@ class SplitFedServer:
         self._weights_nn_unit_send(list_clients_init)
 
     def _weights_nn_unit_send(self, list_client_threads): 
-        for client_thread in list_client_threads: 
-            client_thread.neural_network_load_client(self.neural_network_unit.state_dict())
+        """Send the client side of the unit weights, as the current global
+        version, to `list_client_threads`.
+
+        The weights are encoded once for all the clients, and sent to them
+        concurrently.
+        """
+
+        if len(list_client_threads) == 0: 
+            return
+        broadcast = self._global_broadcast(list_client_threads[0])
+        self._run_clients("weights_send", [
+            (client_thread.neural_network_load_client, (broadcast,))
+            for client_thread in list_client_threads
+        ])
+
+    def _global_broadcast(self, client_thread) -> GlobalWeightsBroadcast: 
+        """Broadcast of the client side of the current global weights.
+
+        The broadcast is kept for as long as the version is current, such that
+        the clients that get the version later, e.g. as they join or start a
+        round, share the frames already encoded for it.
+        """
+
+        if (self._broadcast == None) or (self._broadcast.version != self.global_version): 
+            self._broadcast = GlobalWeightsBroadcast(
+                'MSG_INITIAL_GLOBAL_WEIGHTS_SERVER_TO_CLIENT',
+                utils.slice_weights_client(
+                    self.neural_network_unit.state_dict(),
+                    client_thread.neural_network.state_dict(),
+                ),
+                self.global_version,
+            )
+        return self._broadcast
 
     def compose_unit_neural_networks(self): 
-        for client_thread in self.threads: 
-            client_thread.neural_network_unit_compose(self.neural_network_unit)
+        """Receive the unit weights of the clients, which are packed for the
+        aggregation as they arrive."""
+
+        self.flat_aggregation = aggregation.FlatAggregation(
+            self.neural_network_unit.state_dict(), len(self.round_threads),
+            self.flat_aggregation,
+        )
+        self._run_clients("weights_receive", [
+            (
+                client_thread.neural_network_unit_compose,
+                (self.neural_network_unit, self.flat_aggregation),
+            )
+            for client_thread in self.round_threads
+        ])
+        self._stalled_drop()
 
     def validate_models(self) -> List[ValidatedModel]: 
-        collection_threads = []
-        for client_thread in self.threads:
+        """Validate the models of the candidates of the round on every client
+        of the round."""
+
+        model_collections = []
+        buffers = None
+        candidates = self._round_candidates()
+        for client_thread in self.round_threads:
             model_collection = CollectionValidateModelState()
-            for client_index_, client_thread_ in enumerate(self.threads): 
+            for client_index_ in candidates: 
                 model_collection.add_model(
-                    client_thread_.unit_state_dict, client_index_
+                    self.round_threads[client_index_].unit_state_dict,
+                    client_index_,
                 )
-            thread_execution = threading.Thread(
-                target=client_thread.validate_models, args=(model_collection, )
-            )
-            collection_threads.append(
-                CollectionThreadContext(thread_execution, model_collection)
-            )
-        for thread_context in collection_threads:
-            thread_context.start_thread()
+            # every client validates the same models
+            if buffers == None: 
+                buffers = encode_msg([
+                    "MODELS_TO_VALIDATE", model_collection.models_to_validate()
+                ])
+            model_collections.append(model_collection)
+        self._run_clients("validate_models", [
+            (client_thread.validate_models, (model_collection, buffers))
+            for client_thread, model_collection
+            in zip(self.round_threads, model_collections)
+        ])
         collection_combined = CollectionCombinedValidations()
-        for thread_context in collection_threads: 
-            thread_context.join_thread()
-            client_validations = thread_context.model_collection
+        for client_validations in model_collections: 
             collection_combined.add_validation_results(client_validations) 
         return collection_combined\
             .compute_models_validation_result()
@@ -546,9 +957,8 @@ class SplitFedServer:
             validation_softmax.add_validation_result(model)
         validation_softmax.compute_softmax()
         logger.info(validation_softmax.softmax)
-        zero_model = utils.zero_init(self.neural_network_unit).state_dict()
-        return utils.fed_avg(
-            zero_model, list(validation_softmax.zip_state_dict_softmax())
+        return self.flat_aggregation.weighted_average(
+            validation_softmax.zip_state_dict_softmax()
         )
 
     def select_best_model(self, validated_models: List[ValidatedModel]): 
@@ -568,44 +978,68 @@ class SplitFedServer:
         pass
 
     def fed_avg(self): 
-        list_weights_concat = []
-        distributed_inputs_total = functools.reduce(
-            lambda acc, x: x.inputs_total + acc, self.threads, 0
+        streaming_aggregation = self.streaming_aggregation
+        self.streaming_aggregation = None
+        if streaming_aggregation == None: 
+            # the weights were not folded in during the training
+            streaming_aggregation = aggregation.StreamingAggregation(
+                self.neural_network_unit.state_dict()
+            )
+            self._run_clients("weights_receive", [
+                (
+                    client_thread.neural_network_unit_fold,
+                    (self.neural_network_unit, streaming_aggregation),
+                )
+                for client_thread in self.round_threads
+            ])
+            self._stalled_drop()
+        for state_dict, weight in self.round_deadline.deferred_take(): 
+            streaming_aggregation.add(state_dict, weight)
+        if streaming_aggregation.count == 0: 
+            logger.warning("No client met the deadline, the weights are kept")
+            return
+        aggregated_model = streaming_aggregation.average()
+        self.neural_network_unit.load_state_dict(aggregated_model)
+
+    def _validate_model_assignments(
+        self
+    ) -> List["ModelStateValidationContext"]: 
+        """Validate the unit model of every candidate of the round on another,
+        random, client.
+
+        Every client of the round validates one model, so when there are
+        fewer candidates than clients, some models are validated more than
+        once, and only the first validation of every model is returned.
+        """
+
+        self.compose_unit_neural_networks()
+        validation_contexts = []
+        num_threads = len(self.round_threads)
+        candidates = self._round_candidates()
+        candidates = random.sample(candidates, len(candidates))
+        assignments = zip(
+            (candidates[i % len(candidates)] for i in range(num_threads)),
+            random.sample(range(num_threads), num_threads),
         )
-        for thread in self.threads: 
-            weights_concat = thread.neural_network_unit_compose(self.neural_network_unit)
-            list_weights_concat.append((
-                weights_concat, thread.inputs_total/distributed_inputs_total
+        for client_idx, assigned_idx in assignments: 
+            original_client = self.round_threads[client_idx]
+            assigned_client = self.round_threads[assigned_idx]
+            validate_model_state = ValidateModelState(original_client.unit_state_dict)
+            validation_contexts.append(ModelStateValidationContext(
+                assigned_client, assigned_idx,
+                original_client, client_idx, validate_model_state
             ))
-        zero_model = utils.zero_init(self.neural_network_unit).state_dict()
-        aggregated_model = utils.fed_avg(
-            zero_model, list_weights_concat
-        )
-        self.neural_network_unit.load_state_dict(aggregated_model)
+        self._run_clients("validate_model", [
+            (context.assigned_client.validate_model, (context.validate_model_state,))
+            for context in validation_contexts
+        ])
+        return validation_contexts[:len(candidates)]
 
     def best_validation_model(self): 
-        validation_threads = []
-        num_threads = len(self.threads)
-        for client_idx, assigned_idx in enumerate(random.sample(range(num_threads), num_threads)): 
-            original_client = self.threads[client_idx]
-            unit_state = original_client.neural_network_unit_compose(self.neural_network_unit)
-            assigned_client = self.threads[assigned_idx]
-            validate_model_state = ValidateModelState(unit_state)
-            thread_execution = threading.Thread(
-                target=assigned_client.validate_model,
-                args=(validate_model_state,)
-            )
-            thread_context = ModelStateValidationThreadContext(
-                thread_execution, assigned_client, assigned_idx,
-                original_client, client_idx, validate_model_state
-            )
-            validation_threads.append(thread_context)
-        for thread_context in validation_threads: 
-            thread_context.start_thread()
+        validation_threads = self._validate_model_assignments()
 
         best_result = BestModelStateValidation()
         for thread_context in validation_threads: 
-            thread_context.join_thread()
             validate_model_state = thread_context.validate_model_state
             validation_result = validate_model_state.validation_result
             logger.info(
@@ -624,33 +1058,14 @@ class SplitFedServer:
 
 
     def validation_softmax(self): 
-        validation_threads = []
-        num_threads = len(self.threads)
-        for client_idx, assigned_idx in enumerate(random.sample(range(num_threads), num_threads)): 
-            original_client = self.threads[client_idx]
-            unit_state = original_client.neural_network_unit_compose(self.neural_network_unit)
-            assigned_client = self.threads[assigned_idx]
-            validate_model_state = ValidateModelState(unit_state)
-            thread_execution = threading.Thread(
-                target=assigned_client.validate_model,
-                args=(validate_model_state,)
-            )
-            thread_context = ModelStateValidationThreadContext(
-                thread_execution, assigned_client, assigned_idx,
-                original_client, client_idx, validate_model_state
-            )
-            validation_threads.append(thread_context)
-        for thread_context in validation_threads: 
-            thread_context.start_thread()
+        validation_threads = self._validate_model_assignments()
 
         validation_softmax = ValidationSoftmax()
         for thread_context in validation_threads: 
-            thread_context.join_thread()
             validation_softmax.add_validation_result(thread_context.validate_model_state)
         validation_softmax.compute_softmax()
-        zero_model = utils.zero_init(self.neural_network_unit).state_dict()
-        aggregated_model = utils.fed_avg(
-            zero_model, list(validation_softmax.zip_state_dict_softmax())
+        aggregated_model = self.flat_aggregation.weighted_average(
+            validation_softmax.zip_state_dict_softmax()
         )
         logger.info(f"Validation results: {validation_softmax._validation_results.squeeze(1).tolist()}")
         logger.info(f"Model weights: {validation_softmax.softmax}")
@@ -658,21 +1073,13 @@ class SplitFedServer:
 
 
     def validate(self): 
-        threads_training = [
-            threading.Thread(
-                target=t.validate, 
-                name=f"thread_validate_{i}"
-            ) 
-            for i, t in enumerate(self.threads)
-        ]
         logger.debug("Start threads validation")
-        for t in threads_training: 
-            t.start()
-        for t in threads_training: 
-            t.join()
+        self._run_clients(
+            "validate", [(t.validate, ()) for t in self.round_threads]
+        )
         outputs = []
         targets = []
-        for t in self.threads:
+        for t in self.round_threads:
             outputs.append(t.outputs_validate)
             targets.append(t.targets_validate)
         return outputs, targets
@@ -694,10 +1101,9 @@ class SplitFedServer:
         logger.info(f"Test Accuracy: {acc}")
 
 
-class ModelStateValidationThreadContext:
+class ModelStateValidationContext:
 
     
-    thread_execution: threading.Thread
     assigned_client: SplitFedServerThread
     assigned_client_idx: int
     original_client: SplitFedServerThread
@@ -705,45 +1111,20 @@ class ModelStateValidationThreadContext:
     validate_model_state: ValidateModelState
 
     def __init__(
-        self, thread_execution, assigned_client, assigned_client_idx,
+        self, assigned_client, assigned_client_idx,
         original_client, original_client_idx, validate_model_state
     ):
-        self.thread_execution = thread_execution
         self.assigned_client = assigned_client
         self.assigned_client_idx = assigned_client_idx
         self.original_client = original_client
         self.original_client_idx = original_client_idx
         self.validate_model_state = validate_model_state
 
-    def start_thread(self): 
-        self.thread_execution.start()
-
-    def join_thread(self): 
-        self.thread_execution.join()
-
     @property
     def validation_result(self): 
         return self.validate_model_state.validation_result
 
 
-class CollectionThreadContext: 
-
-
-    thread_execution: threading.Thread
-    model_collection: CollectionValidateModelState
-
-    def __init__(self, thread_execution, model_collection): 
-        self.thread_execution = thread_execution
-        self.model_collection = model_collection
-
-    def start_thread(self): 
-        self.thread_execution.start()
-
-    def join_thread(self): 
-        self.thread_execution.join()
-
-
-
 class ModelCombinedValidations: 
 
 
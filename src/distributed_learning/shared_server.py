@@ -0,0 +1,169 @@
+import threading
+import logging
+import torch
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+from . import utils
+from .server import SplitFedServer, SplitFedServerThread
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StepEntry:
+    inputs: torch.Tensor
+    targets: torch.Tensor
+    gradients: Optional[torch.Tensor] = None
+    error: Optional[BaseException] = None
+
+
+class BatchedServerStep:
+    """Training steps of a shared server side model over several clients.
+
+    The clients that are training submit the activations of their iterations,
+    and once every one of them has submitted, the last one to do so runs a
+    single forward and backward pass over the concatenated activations and
+    scatters the gradients back. The loss is the sum of the loss of each
+    client, so every client gets the gradients of its own loss, and the
+    optimizer steps on the sum of the clients' gradients, as in SplitFedV2.
+    """
+
+    def __init__(self, neural_network, optimizer, criterion, device):
+        self.neural_network = neural_network
+        self.optimizer = optimizer
+        self.criterion = criterion
+        self.device = device
+        self._condition = threading.Condition()
+        self._participants = 0
+        self._entries: List[StepEntry] = []
+
+    def begin(self, participants: int):
+        """Start the training of `participants` clients."""
+
+        with self._condition:
+            self._participants = participants
+
+    def leave(self):
+        """A client is done training, so the step no longer waits for it."""
+
+        with self._condition:
+            self._participants -= 1
+            if (len(self._entries) > 0) and (len(self._entries) >= self._participants):
+                self._step()
+
+    def step(self, inputs: torch.Tensor, targets: torch.Tensor) -> torch.Tensor:
+        """Gradients of the activations `inputs` of a client."""
+
+        with self._condition:
+            entry = StepEntry(inputs, targets)
+            self._entries.append(entry)
+            if len(self._entries) >= self._participants:
+                self._step()
+            else:
+                self._condition.wait_for(
+                    lambda: (entry.gradients != None) or (entry.error != None)
+                )
+        if entry.error != None:
+            raise entry.error
+        return entry.gradients
+
+    def _step(self):
+        entries, self._entries = self._entries, []
+        try:
+            sizes = [entry.inputs.size()[0] for entry in entries]
+            inputs = torch.cat([entry.inputs for entry in entries])
+            inputs = inputs.to(self.device).requires_grad_()
+            targets = torch.cat([entry.targets for entry in entries]).to(self.device)
+            self.optimizer.zero_grad()
+            outputs = self.neural_network(inputs)
+            loss = sum(
+                self.criterion(outputs_client, targets_client)
+                for outputs_client, targets_client
+                in zip(outputs.split(sizes), targets.split(sizes))
+            )
+            loss.backward()
+            self.optimizer.step()
+            for entry, gradients in zip(entries, inputs.grad.cpu().split(sizes)):
+                entry.gradients = gradients
+        except Exception as e:
+            for entry in entries:
+                entry.error = e
+        self._condition.notify_all()
+
+
+class SharedSplitFedServerThread(SplitFedServerThread):
+    """Client thread that trains the shared server side model through the
+    batched steps of the server."""
+
+    def __init__(
+        self, comm, neural_network, cls_optimizer, criterion,
+        batched_step: BatchedServerStep,
+    ):
+        super().__init__(comm, neural_network, cls_optimizer, criterion)
+        self.batched_step = batched_step
+
+    def optimizer(self, *args, **kwargs):
+        # the optimizer of the shared model belongs to the batched step
+        pass
+
+    def train_offloading(self):
+        try:
+            super().train_offloading()
+        finally:
+            self.batched_step.leave()
+
+    def _train_step(self, msg):
+        smashed_layers, labels = self._activations_decode(msg)
+        self.inputs_total += smashed_layers.size()[0]
+        gradients = self.batched_step.step(smashed_layers.detach(), labels)
+        return [
+            'MSG_SERVER_GRADIENTS_SERVER_TO_CLIENT',
+            *self.codec_gradients.encode(gradients),
+        ]
+
+
+class SharedSplitFedServer(SplitFedServer):
+    """Split federated server with a single server side model.
+
+    All the clients train the same server side model, in batched steps over
+    the activations of the clients, see `BatchedServerStep`, so the memory of
+    the server does not grow with the number of clients. The server side of
+    every unit model is the shared model, and the aggregated unit model is
+    loaded into it once per round.
+    """
+
+    neural_network_server: torch.nn.Module
+    batched_step: BatchedServerStep
+    # the server side of the unit weights is only final once all the clients
+    # are done training
+    fold_during_training = False
+
+    def optimizer(self, *args, **kwargs):
+        super().optimizer(*args, **kwargs)
+        self.neural_network_server = self.nn_server_creator(self.split_layer)
+        self.neural_network_server.to(self.device)
+        self.batched_step = BatchedServerStep(
+            self.neural_network_server,
+            self.cls_optimizer(self.neural_network_server.parameters(), *args, **kwargs),
+            self.criterion, self.device,
+        )
+
+    def _thread_create(self, comm) -> SplitFedServerThread:
+        return SharedSplitFedServerThread(
+            comm, self.neural_network_server, self.cls_optimizer,
+            self.criterion, self.batched_step,
+        )
+
+    def _train(self):
+        self.batched_step.begin(len(self.round_threads))
+        super()._train()
+
+    def _nn_threads_update(self):
+        server_weights = utils.split_weights_server(
+            self.neural_network_unit.state_dict(),
+            self.neural_network_server.state_dict(),
+        )
+        self.neural_network_server.load_state_dict(server_weights)
@@ -0,0 +1,371 @@
+import os
+import mmap
+import array
+import copy
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import time
+import logging
+import torch
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from .communicator import (
+    Communicator, HEADER, ITEM, TENSOR, ITEM_TENSOR, ITEM_TENSOR_SHM,
+    ITEM_PICKLE, decode_msg, msg_type_check, tensor_bytes,
+)
+
+
+logger = logging.getLogger(__name__)
+
+TRANSPORTS = ["tcp", "unix", "shm", "inproc"]
+
+# size of the ring of each direction of a shm connection
+SHM_RING_SIZE = 64 << 20
+# smaller payloads cost less to send inline than through the ring
+SHM_MIN_PAYLOAD = 64 << 10
+
+
+class UnsupportedTransport(Exception):
+    pass
+
+
+def transport_env() -> str:
+    """Transport of the connections requested through the environment."""
+
+    return os.getenv("TRANSPORT", "tcp")
+
+def unix_socket_path(port: int) -> str:
+    """Path of the unix socket that stands in for the TCP port `port`.
+
+    The directory is UNIX_SOCKET_DIR, by default the temporary directory,
+    which the server and the clients have to share.
+    """
+
+    directory = os.getenv("UNIX_SOCKET_DIR", tempfile.gettempdir())
+    return os.path.join(directory, f"splitfed_{port}.sock")
+
+
+class ShmRing:
+    """Single producer, single consumer ring of bytes in shared memory.
+
+    The producer and the consumer both follow the position of the next
+    payload, as the payloads are written in the order of the messages. A
+    payload never wraps around: if it does not fit before the end of the ring,
+    it starts at the beginning. The consumer publishes the number of bytes it
+    has consumed, which the producer waits on when the ring is full.
+
+    The ring is an anonymous file, whose descriptor is passed to the peer
+    over the unix socket, so it goes away with the two ends of the connection.
+    """
+
+    CONSUMED = struct.Struct("=Q")
+
+    def __init__(self, fd: Optional[int] = None, size: int = SHM_RING_SIZE):
+        if fd == None:
+            fd = memfd_create("splitfed_ring")
+            os.ftruncate(fd, self.CONSUMED.size + size)
+        self.fd = fd
+        self.mmap = mmap.mmap(fd, os.fstat(fd).st_size)
+        self.buf = memoryview(self.mmap)
+        self.size = len(self.buf) - self.CONSUMED.size
+        self.position = 0
+
+    def _consumed(self) -> int:
+        return self.CONSUMED.unpack_from(self.buf, 0)[0]
+
+    def _offset(self, nbytes: int) -> int:
+        offset = self.position % self.size
+        if offset + nbytes > self.size:
+            self.position += self.size - offset
+            offset = 0
+        return self.CONSUMED.size + offset
+
+    def fits(self, nbytes: int) -> bool:
+        return nbytes <= self.size//2
+
+    def write(self, payload: memoryview):
+        nbytes = len(payload)
+        offset = self._offset(nbytes)
+        while self.position + nbytes - self._consumed() > self.size:
+            time.sleep(50e-6)
+        self.buf[offset:(offset + nbytes)] = payload
+        self.position += nbytes
+
+    def read_into(self, buffer: memoryview):
+        nbytes = len(buffer)
+        offset = self._offset(nbytes)
+        buffer[:] = self.buf[offset:(offset + nbytes)]
+        self.position += nbytes
+        self.CONSUMED.pack_into(self.buf, 0, self.position)
+
+    def close(self):
+        self.buf.release()
+        self.mmap.close()
+        os.close(self.fd)
+
+
+def memfd_create(name: str) -> int:
+    if hasattr(os, "memfd_create"):
+        return os.memfd_create(name)
+    # an unlinked temporary file stands in for it elsewhere
+    return os.dup(tempfile.TemporaryFile().fileno())
+
+def fds_send(sock: socket.socket, fds: List[int]):
+    sock.sendmsg(
+        [b"\0"], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds))]
+    )
+
+def fds_recv(sock: socket.socket, nr_fds: int) -> List[int]:
+    fds = array.array("i")
+    _, ancillary, _, _ = sock.recvmsg(1, socket.CMSG_LEN(nr_fds*fds.itemsize))
+    for level, kind, data in ancillary:
+        if (level == socket.SOL_SOCKET) and (kind == socket.SCM_RIGHTS):
+            fds.frombytes(data[:(len(data) - (len(data) % fds.itemsize))])
+    if len(fds) != nr_fds:
+        raise ConnectionError("Shared memory rings were not received")
+    return list(fds)
+
+
+class ShmCommunicator(Communicator):
+    """Communicator over a unix socket, with the tensor payloads passed
+    through shared memory rings.
+
+    The frames are those of `Communicator`, except that large tensors are
+    marked as `ITEM_TENSOR_SHM` and their payload is written into the ring of
+    the direction instead of the socket, as long as it fits.
+    """
+
+    def __init__(self, sock, ring_send: ShmRing, ring_recv: ShmRing):
+        super().__init__(sock=sock)
+        self.ring_send = ring_send
+        self.ring_recv = ring_recv
+
+    def send_buffers(self, buffers: List[Any]):
+        frame = bytearray(buffers[0])
+        _, nr_items, _ = HEADER.unpack_from(frame)
+        offset = HEADER.size
+        inline = [frame]
+        ring_bytes = 0
+        for payload in buffers[1:(nr_items + 1)]:
+            kind, nbytes = ITEM.unpack_from(frame, offset)
+            if kind == ITEM_TENSOR:
+                _, _, ndim = TENSOR.unpack_from(frame, offset + ITEM.size)
+                # a message never fills the ring on its own
+                if (nbytes >= SHM_MIN_PAYLOAD) and self.ring_send.fits(ring_bytes + nbytes):
+                    self.ring_send.write(memoryview(payload).cast("B"))
+                    self.bytes_sent += nbytes
+                    ring_bytes += nbytes
+                    frame[offset] = ITEM_TENSOR_SHM
+                    payload = b""
+                offset += ITEM.size + TENSOR.size + 8*ndim
+            else:
+                offset += ITEM.size
+            inline.append(payload)
+        super().send_buffers(inline)
+
+    def _recv_payload_into(self, kind, buffer):
+        if kind == ITEM_TENSOR_SHM:
+            buffer = memoryview(buffer).cast("B")
+            self.ring_recv.read_into(buffer)
+            self.bytes_received += len(buffer)
+        else:
+            self.recv_into(buffer)
+
+    @classmethod
+    def connect_unix(cls, path: str) -> "ShmCommunicator":
+        sock = socket.socket(socket.AF_UNIX)
+        sock.connect(path)
+        ring_send, ring_recv = ShmRing(), ShmRing()
+        fds_send(sock, [ring_send.fd, ring_recv.fd])
+        return cls(sock, ring_send, ring_recv)
+
+    @classmethod
+    def accept_unix(cls, sock) -> "ShmCommunicator":
+        fd_recv, fd_send = fds_recv(sock, 2)
+        return cls(sock, ShmRing(fd_send), ShmRing(fd_recv))
+
+    def close(self):
+        self.ring_send.close()
+        self.ring_recv.close()
+        self.sock.close()
+
+
+def inproc_copy(item: Any) -> Any:
+    """Copy of a message item, which the sender may go on to modify."""
+
+    if isinstance(item, torch.Tensor):
+        return item.detach().clone().requires_grad_(item.requires_grad)
+    return copy.deepcopy(item)
+
+
+class InProcessCommunicator(Communicator):
+    """Communicator between two threads of a process, over a pair of queues.
+
+    The messages are passed as they are, with copies of their items, instead
+    of being encoded, and only the tensor payloads are counted in the bytes
+    sent and received.
+    """
+
+    def __init__(self, queue_send: queue.Queue, queue_recv: queue.Queue, peer: str):
+        self.ip = None
+        self.queue_send = queue_send
+        self.queue_recv = queue_recv
+        self._peer = peer
+        # message received by `wait_readable`
+        self._next_msg: Optional[List[Any]] = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @staticmethod
+    def _tensor_nbytes(msg: List[Any]) -> int:
+        return sum(
+            item.nbytes for item in msg[1:] if isinstance(item, torch.Tensor)
+        )
+
+    def peer(self) -> str:
+        return self._peer
+
+    def send_msg(self, msg):
+        msg = [msg[0], *(inproc_copy(item) for item in msg[1:])]
+        self.bytes_sent += self._tensor_nbytes(msg)
+        self.queue_send.put(msg)
+        self._log_msg(msg, "sent to")
+
+    def send_buffers(self, buffers: List[Any]):
+        msg = decode_msg(buffers)
+        self.bytes_sent += self._tensor_nbytes(msg)
+        self.queue_send.put(msg)
+
+    def wait_readable(self, timeout: Optional[float]) -> bool:
+        if self._next_msg == None:
+            try:
+                self._next_msg = self.queue_recv.get(timeout=timeout)
+            except queue.Empty:
+                return False
+        return True
+
+    def close(self):
+        # the peer receives None, the end of the connection
+        self.queue_send.put(None)
+
+    def recv_msg(self, expect_msg_type=None):
+        msg = self._next_msg if self._next_msg != None else self.queue_recv.get()
+        self._next_msg = None
+        if msg == None:
+            raise ConnectionError("Connection closed by peer")
+        self.bytes_received += self._tensor_nbytes(msg)
+        self._log_msg(msg, "received from")
+        return msg_type_check(msg, expect_msg_type)
+
+
+class Listener(ABC):
+    """Accepts the connections of the clients of a transport."""
+
+    @abstractmethod
+    def accept(self) -> Optional[Communicator]:
+        """Communicator of the next client, or None if no client connected
+        within the timeout of the listener."""
+
+    def close(self):
+        pass
+
+
+class SocketListener(Listener):
+    """Listener of the socket based transports: tcp, unix and shm."""
+
+    def __init__(self, transport: str, ip_address: str, port: int, timeout=5):
+        self.transport = transport
+        if transport == "tcp":
+            self.sock = socket.socket()
+            self.sock.bind((ip_address, port))
+        else:
+            self.path = unix_socket_path(port)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self.sock = socket.socket(socket.AF_UNIX)
+            self.sock.bind(self.path)
+        self.sock.settimeout(timeout)
+        self.sock.listen(5)
+
+    def accept(self) -> Optional[Communicator]:
+        try:
+            (sock, address) = self.sock.accept()
+        except socket.timeout:
+            return None
+        sock.settimeout(None)
+        if self.transport == "shm":
+            comm = ShmCommunicator.accept_unix(sock)
+        else:
+            comm = Communicator(sock=sock)
+        comm.ip = address[0] if isinstance(address, tuple) else self.transport
+        return comm
+
+    def close(self):
+        self.sock.close()
+        if self.transport != "tcp" and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+# listeners of the inproc transport, by port
+_inproc_listeners: Dict[int, "InProcessListener"] = {}
+_inproc_lock = threading.Lock()
+
+
+class InProcessListener(Listener):
+
+    def __init__(self, port: int, timeout=5):
+        self.port = port
+        self.timeout = timeout
+        self.connections: queue.Queue = queue.Queue()
+        with _inproc_lock:
+            _inproc_listeners[port] = self
+
+    def accept(self) -> Optional[Communicator]:
+        try:
+            return self.connections.get(timeout=self.timeout)
+        except queue.Empty:
+            return None
+
+    def connect(self) -> Communicator:
+        to_server, to_client = queue.Queue(), queue.Queue()
+        self.connections.put(InProcessCommunicator(to_client, to_server, "client"))
+        return InProcessCommunicator(to_server, to_client, "server")
+
+    def close(self):
+        with _inproc_lock:
+            _inproc_listeners.pop(self.port, None)
+
+
+def listener_create(transport: str, ip_address: str, port: int) -> Listener:
+    if transport in ("tcp", "unix", "shm"):
+        return SocketListener(transport, ip_address, port)
+    if transport == "inproc":
+        return InProcessListener(port)
+    raise UnsupportedTransport(transport)
+
+def communicator_connect(transport: str, address: str, port: int) -> Communicator:
+    """Connect to the server listening on `address`:`port`, or, for the
+    local transports, on the unix socket or in-process listener of `port`."""
+
+    if transport == "tcp":
+        comm = Communicator()
+        comm.connect((address, port))
+        return comm
+    if transport == "unix":
+        comm = Communicator(sock=socket.socket(socket.AF_UNIX))
+        comm.sock.connect(unix_socket_path(port))
+        return comm
+    if transport == "shm":
+        return ShmCommunicator.connect_unix(unix_socket_path(port))
+    if transport == "inproc":
+        with _inproc_lock:
+            listener = _inproc_listeners.get(port)
+        if listener == None:
+            raise ConnectionRefusedError(f"No in-process listener on {port}")
+        return listener.connect()
+    raise UnsupportedTransport(transport)
@@ -64,6 +64,13 @@ def split_weights_server(weights, sweights):
         sweights[skeys[sidx]] = weights[keys[widx]]
     return sweights
 
+def slice_weights_client(weights, sweights):
+    """Client side entries of the unit `weights`, i.e., all the entries but the
+    last `len(sweights)`."""
+
+    keys = list(weights)[:(len(weights) - len(sweights))]
+    return collections.OrderedDict((key, weights[key]) for key in keys)
+
 def concat_weights(weights, cweights, sweights):
     concat_dict = collections.OrderedDict()
 
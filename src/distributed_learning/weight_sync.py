@@ -0,0 +1,204 @@
+import os
+import torch
+import threading
+import collections
+
+from typing import Any, Dict, List, Optional, OrderedDict, Tuple
+
+from . import codecs
+from .communicator import encode_msg
+
+
+# top-k would drop most of every delta, and the local weights carry nothing
+# that is not sent over to the next round
+WEIGHT_CODECS = ["identity", "fp16", "bf16", "int8"]
+
+
+class WeightSyncException(Exception):
+    pass
+
+
+def weight_sync_spec_env() -> str:
+    """Weight synchronization requested through the environment."""
+
+    return os.getenv("WEIGHT_SYNC", "full")
+
+
+class WeightSync:
+    """Versioned synchronization of the client side weights of a connection.
+
+    The server sends versions of the global client side weights, and the
+    client sends its locally trained weights. Both ends keep the last global
+    version, as reconstructed by the client, which is the reference of the
+    deltas in both directions: the server sends the difference between the new
+    global weights and the reference, once the client has acknowledged it, and
+    the client sends the difference between its weights and the reference. The
+    version of the reference is sent along with the local weights, and serves
+    as the acknowledgement of that version.
+
+    The specification `<mode>[:<codec>]` selects whether the weights are sent
+    in `full` or as a `delta`, and the codec with which floating point tensors
+    are encoded, e.g. `delta:int8`. The sender always computes what the
+    receiver reconstructs, such that the quantization error of a version is
+    sent with the next one.
+    """
+
+    def __init__(self, spec: str = "full"):
+        mode, _, codec_spec = spec.partition(":")
+        codec_spec = codec_spec or "identity"
+        if (mode not in ("full", "delta")) or (codec_spec.split(":")[0] not in WEIGHT_CODECS):
+            raise WeightSyncException(f"Unsupported weight synchronization: {spec}")
+        self.delta = mode == "delta"
+        self.codec = codecs.codec_create(codec_spec)
+        self.reference_version = 0
+        self.reference: Optional[OrderedDict] = None
+        self.acknowledged_version = 0
+
+    def global_base_version(self) -> Optional[int]:
+        """Version the next global weights are a delta against, if any."""
+
+        if (self.delta and (self.reference != None)
+                and (self.acknowledged_version == self.reference_version)):
+            return self.reference_version
+        return None
+
+    def encode_global(self, state_dict: OrderedDict, version: int) -> List[Any]:
+        """Encode the global weights of `version`, which become the reference."""
+
+        base_version = self.global_base_version()
+        items, nr_items, reconstructed = self._encode(
+            state_dict, self.reference if base_version != None else None
+        )
+        self.global_sent(version, reconstructed)
+        header = self._header(version, base_version, nr_items, state_dict)
+        return [header, *items]
+
+    def global_sent(self, version: int, reconstructed: OrderedDict):
+        self.reference_version = version
+        self.reference = reconstructed
+
+    def decode_global(self, msg_items: List[Any]) -> OrderedDict:
+        header, items = msg_items[0], msg_items[1:]
+        base = self._base(header)
+        self.reference = self._decode(header, items, base)
+        self.reference_version = header["version"]
+        return self.reference
+
+    def encode_local(self, state_dict: OrderedDict) -> List[Any]:
+        """Encode the local weights against the reference."""
+
+        base_version = self.reference_version if self.delta else None
+        items, nr_items, _ = self._encode(
+            state_dict, self.reference if self.delta else None
+        )
+        header = self._header(
+            self.reference_version, base_version, nr_items, state_dict
+        )
+        return [header, *items]
+
+    def decode_local(self, msg_items: List[Any]) -> OrderedDict:
+        header, items = msg_items[0], msg_items[1:]
+        self.acknowledged_version = header["version"]
+        base = self._base(header)
+        return self._decode(header, items, base)
+
+    def _header(self, version, base_version, nr_items, state_dict):
+        return {
+            # global version, which the local weights acknowledge
+            "version": version,
+            # global version the weights are a delta against, if any
+            "base": base_version,
+            "codec": self.codec.name,
+            "keys": list(state_dict),
+            # number of encoded tensors of each key, 0 if sent as is
+            "items": nr_items,
+        }
+
+    def _base(self, header) -> Optional[OrderedDict]:
+        if header["base"] == None:
+            return None
+        if header["base"] != self.reference_version:
+            raise WeightSyncException(
+                f"Delta against version {header['base']}, "
+                f"but the reference is version {self.reference_version}"
+            )
+        return self.reference
+
+    def _encode(
+        self, state_dict: OrderedDict, base: Optional[OrderedDict]
+    ) -> Tuple[List[torch.Tensor], List[int], OrderedDict]:
+        """Encoded tensors, their number per key, and the state_dict that the
+        receiver reconstructs from them."""
+
+        items = []
+        nr_items = []
+        reconstructed = collections.OrderedDict()
+        for key, tensor in state_dict.items():
+            tensor = tensor.detach().cpu()
+            if not tensor.is_floating_point():
+                items.append(tensor)
+                nr_items.append(0)
+                reconstructed[key] = tensor.clone()
+                continue
+            update = tensor - base[key] if base != None else tensor
+            encoded = self.codec.encode(update)
+            items.extend(encoded)
+            nr_items.append(len(encoded))
+            decoded = self.codec.decode(encoded).to(tensor.dtype)
+            reconstructed[key] = (
+                base[key] + decoded if base != None else decoded.clone()
+            )
+        return items, nr_items, reconstructed
+
+    def _decode(
+        self, header, items: List[torch.Tensor], base: Optional[OrderedDict]
+    ) -> OrderedDict:
+        codec = codecs.codec_create(header["codec"])
+        state_dict = collections.OrderedDict()
+        position = 0
+        for key, nr_encoded in zip(header["keys"], header["items"]):
+            if nr_encoded == 0:
+                state_dict[key] = items[position]
+                position += 1
+                continue
+            decoded = codec.decode(items[position:(position + nr_encoded)])
+            position += nr_encoded
+            state_dict[key] = base[key] + decoded if base != None else decoded
+        return state_dict
+
+
+class GlobalWeightsBroadcast:
+    """Global weights of a version, sent to several clients.
+
+    The message is encoded once per distinct reference of the clients, which
+    is a single one when they have all acknowledged the previous version, and
+    the encoded frame is shared by all the clients with that reference. The
+    references of clients with the same base version may still differ, e.g.,
+    when a quantized delta and the full weights of that version were sent, so
+    they are told apart by identity.
+    """
+
+    def __init__(self, msg_type: str, state_dict: OrderedDict, version: int):
+        self.msg_type = msg_type
+        self.state_dict = state_dict
+        self.version = version
+        self._encoded: Dict[Any, Tuple[List[Any], OrderedDict]] = {}
+        self._lock = threading.Lock()
+
+    def buffers(self, weight_sync: WeightSync) -> List[Any]:
+        """Frame of the message for the client of `weight_sync`."""
+
+        base_version = weight_sync.global_base_version()
+        key = None
+        if base_version != None:
+            key = (base_version, id(weight_sync.reference))
+        with self._lock:
+            if key not in self._encoded:
+                items = weight_sync.encode_global(self.state_dict, self.version)
+                self._encoded[key] = (
+                    encode_msg([self.msg_type, *items]), weight_sync.reference
+                )
+                return self._encoded[key][0]
+        buffers, reconstructed = self._encoded[key]
+        weight_sync.global_sent(self.version, reconstructed)
+        return buffers
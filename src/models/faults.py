@@ -0,0 +1,108 @@
+import numpy as np
+
+from typing import Dict, Type
+from dataclasses import dataclass
+
+
+class UnknownFaultModel(Exception):
+    pass
+
+
+@dataclass
+class GaussianNoise:
+    """Zero mean noise, with a standard deviation of `relative_noise` times the
+    standard deviation of each feature."""
+
+    relative_noise: float = 0.5
+
+    def apply(self, values: np.ndarray, rng: np.random.Generator):
+        noise = rng.standard_normal(values.shape)
+        noise *= feature_std(values)*self.relative_noise
+        values += noise
+
+
+@dataclass
+class BiasDrift:
+    """Bias growing linearly over the lifetime of the unit.
+
+    Each feature drifts towards a final bias drawn from a zero mean normal
+    distribution with a standard deviation of `relative_noise` times the
+    standard deviation of the feature.
+    """
+
+    relative_noise: float = 0.5
+
+    def apply(self, values: np.ndarray, rng: np.random.Generator):
+        bias = rng.normal(0, feature_std(values)*self.relative_noise)
+        ramp = np.linspace(0, 1, values.shape[0])
+        values += ramp[:, np.newaxis]*bias
+
+
+@dataclass
+class StuckSensor:
+    """A fraction of the features holds its value from a random row onwards."""
+
+    stuck_fraction: float = 0.2
+
+    def apply(self, values: np.ndarray, rng: np.random.Generator):
+        nr_rows, nr_features = values.shape
+        features = np.flatnonzero(rng.random(nr_features) < self.stuck_fraction)
+        onsets = rng.integers(0, nr_rows, features.shape[0])
+        stuck = np.arange(nr_rows)[:, np.newaxis] >= onsets
+        values[:, features] = np.where(
+            stuck, values[onsets, features], values[:, features]
+        )
+
+
+@dataclass
+class DropoutBursts:
+    """Bursts of consecutive rows in which a feature reads zero.
+
+    Bursts start at a rate of `burst_rate` per row, each on a random feature,
+    and their lengths follow a geometric distribution with a mean of
+    `burst_length` rows.
+    """
+
+    burst_rate: float = 0.001
+    burst_length: float = 50
+
+    def apply(self, values: np.ndarray, rng: np.random.Generator):
+        nr_rows, nr_features = values.shape
+        nr_bursts = rng.poisson(self.burst_rate*nr_rows)
+        starts = rng.integers(0, nr_rows, nr_bursts)
+        stops = np.minimum(
+            starts + rng.geometric(1/self.burst_length, nr_bursts), nr_rows
+        )
+        features = rng.integers(0, nr_features, nr_bursts)
+
+        # the (row, feature) cells of all the bursts, built from the burst
+        # boundaries only: each burst is its start row repeated over its
+        # length, plus the offsets within the burst
+        lengths = stops - starts
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        values[np.repeat(starts, lengths) + offsets, np.repeat(features, lengths)] = 0
+
+
+FAULT_MODELS: Dict[str, Type] = {
+    "gaussian": GaussianNoise,
+    "bias_drift": BiasDrift,
+    "stuck_sensor": StuckSensor,
+    "dropout": DropoutBursts,
+}
+
+def feature_std(values: np.ndarray) -> np.ndarray:
+    return values.std(axis=0, ddof=1)
+
+def fault_model_create(name: str, relative_noise: float):
+    """Create the fault model registered as `name`.
+
+    `relative_noise` sets the amplitude of the fault models with one, and is
+    ignored by the others.
+    """
+
+    if name not in FAULT_MODELS:
+        raise UnknownFaultModel(name)
+    fault_model = FAULT_MODELS[name]
+    if "relative_noise" in fault_model.__dataclass_fields__:
+        return fault_model(relative_noise=relative_noise)
+    return fault_model()
@@ -0,0 +1,125 @@
+import os
+import json
+import shutil
+import fcntl
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+from typing import Any, Callable, Dict, Tuple
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+COLUMNS_FILE = "columns.json"
+INDEX_FILE = "index.npy"
+
+
+class MissingCacheEntry(Exception):
+    pass
+
+def cache_key(*parts: Any) -> str:
+    """Hash of the json representation of `parts`."""
+
+    serialized = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+def source_identity(file_path: str) -> Dict[str, Any]:
+    """Identity of a source file, which changes whenever the file changes."""
+
+    stat = os.stat(file_path)
+    return {
+        "path": os.path.realpath(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+def cache_load(directory: str) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Load a frame and its metadata stored by `cache_store`.
+
+    Every column is stored in its own npy file, and the column names, together
+    with the metadata of the entry, are stored in a json file.
+    """
+
+    columns_path = os.path.join(directory, COLUMNS_FILE)
+    if not os.path.isfile(columns_path):
+        raise MissingCacheEntry()
+
+    with open(columns_path, "r") as f:
+        entry = json.load(f)
+    data = {
+        column: np.load(os.path.join(directory, f"{i}.npy"))
+        for i, column in enumerate(entry["columns"])
+    }
+    index = np.load(os.path.join(directory, INDEX_FILE))
+    return pd.DataFrame(data, index=index), entry["metadata"]
+
+def cache_store(
+    directory: str, frame: pd.DataFrame, metadata: Dict[str, Any]
+):
+    """Store a frame in `directory`.
+
+    The entry is written to a temporary directory which is then renamed to
+    `directory`, such that readers never observe a partially written entry. If
+    another process has stored the entry in the meantime, its entry is kept.
+    """
+
+    directory_tmp = f"{directory}.tmp-{os.getpid()}"
+    if os.path.isdir(directory_tmp):
+        shutil.rmtree(directory_tmp)
+    os.makedirs(directory_tmp)
+
+    for i, column in enumerate(frame.columns):
+        np.save(os.path.join(directory_tmp, f"{i}.npy"), frame[column].to_numpy())
+    np.save(os.path.join(directory_tmp, INDEX_FILE), frame.index.to_numpy())
+    with open(os.path.join(directory_tmp, COLUMNS_FILE), "w") as f:
+        json.dump({
+            "columns": [str(column) for column in frame.columns],
+            "metadata": metadata,
+        }, f)
+
+    try:
+        os.rename(directory_tmp, directory)
+    except OSError:
+        shutil.rmtree(directory_tmp)
+
+@contextmanager
+def cache_lock(directory: str):
+    """Exclusive lock over the population of the entry at `directory`."""
+
+    with open(f"{directory}.lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def cache_populate(
+    directory: str,
+    create: Callable[[], Tuple[pd.DataFrame, Dict[str, Any]]],
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Load the entry at `directory`, creating it with `create` if missing.
+
+    Processes sharing the cache directory populate a missing entry only once:
+    the first one creates it while holding the entry's lock, and the others
+    wait for the lock and then load the stored entry.
+    """
+
+    try:
+        return cache_load(directory)
+    except MissingCacheEntry:
+        pass
+
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    with cache_lock(directory):
+        try:
+            frame, metadata = cache_load(directory)
+            logger.info(f"Cache entry populated concurrently: {directory}")
+            return frame, metadata
+        except MissingCacheEntry:
+            logger.info(f"Populate cache entry: {directory}")
+        frame, metadata = create()
+        cache_store(directory, frame, metadata)
+    return frame, metadata
@@ -14,13 +14,18 @@ import functools
 import statistics
 
 from typing import List, Dict, Tuple, Optional
-from torch.utils.data import Dataset, random_split, DataLoader
+from torch.utils.data import (
+    Dataset, random_split, DataLoader, BatchSampler, RandomSampler,
+    SequentialSampler
+)
 from pandas import DataFrame
 from torch import nn
 from copy import deepcopy
 from dataclasses import dataclass
 
 from . import FactoryModelDatasets
+from . import frame_cache
+from . import faults
 from distributed_learning import utils
 
 
@@ -31,13 +36,20 @@ with open("models/turbofan.yml") as f:
 
 loss_function = torch.nn.MSELoss()
 
+DATASET_PATH = "data/raw/turbofan_simulation/data_set2/N-CMAPSS_DS02-006.h5"
+CACHE_DIRECTORY = "data/cache/turbofan"
+# bump whenever `read_in_data` changes the frames it returns
+CACHE_VERSION = 1
+H5_CHUNK_ROWS = 1 << 18
+
 def read_in_data(
     filename: str,
     frequency: int,
     X_v_to_keep: List[str],
     X_s_to_keep: List [str],
     training_data: bool = True,
-    keep_all_data: bool = True
+    keep_all_data: bool = True,
+    units: Optional[List[int]] = None,
 ) -> Tuple[pd.DataFrame, List[str]]:
     """Read data from a raw data h5 file.
 
@@ -49,48 +61,35 @@ def read_in_data(
             dataset is to be read in.
         keep_all_data: boolean indicating whether to include only the healthy
             flights from the dataset.
+        units: units whose rows are to be read. If `None`, the rows of all the
+            units are read.
     """
 
+    split = "dev" if training_data == True else "test"
     with h5py.File(filename, 'r') as hdf:
-        # Development set
-        W_dev = np.array(hdf.get('W_dev'))             # W
-        X_s_dev = np.array(hdf.get('X_s_dev'))         # X_s
-        X_v_dev = np.array(hdf.get('X_v_dev'))         # X_v
-        A_dev = np.array(hdf.get('A_dev'))             # Auxiliary
-
-        # Test set
-        W_test = np.array(hdf.get('W_test'))           # W
-        X_s_test = np.array(hdf.get('X_s_test'))       # X_s
-        X_v_test = np.array(hdf.get('X_v_test'))       # X_v
-        A_test = np.array(hdf.get('A_test'))           # Auxiliary
-
         # column names
-        W_var = np.array(hdf.get('W_var'))
-        X_s_var = np.array(hdf.get('X_s_var'))
-        X_v_var = np.array(hdf.get('X_v_var'))
-        T_var = np.array(hdf.get('T_var'))
-        A_var = np.array(hdf.get('A_var'))
-
-    # from np.array to list dtype U4/U5
-    W_var = list(np.array(W_var, dtype='U20'))
-    X_s_var = list(np.array(X_s_var, dtype='U20'))
-    X_v_var = list(np.array(X_v_var, dtype='U20'))
-    T_var = list(np.array(T_var, dtype='U20'))
-    A_var = list(np.array(A_var, dtype='U20'))
-
-    if training_data == True:
-        df_X_s = DataFrame(data=X_s_dev, columns=X_s_var)
-        df_X_v = DataFrame(data=X_v_dev, columns=X_v_var)
-        df_A = DataFrame(data=A_dev, columns=A_var)
-        df_W = DataFrame(data=W_dev, columns=W_var)
-    else:
-        df_X_s = DataFrame(data=X_s_test, columns=X_s_var)
-        df_X_v = DataFrame(data=X_v_test, columns=X_v_var)
-        df_A = DataFrame(data=A_test, columns=A_var)
-        df_W = DataFrame(data=W_test, columns=W_var)
-
-    df_X_s = df_X_s[X_s_to_keep]
-    df_X_v = df_X_v[X_v_to_keep]
+        W_var = read_h5_variables(hdf, 'W_var')
+        X_s_var = read_h5_variables(hdf, 'X_s_var')
+        X_v_var = read_h5_variables(hdf, 'X_v_var')
+        A_var = read_h5_variables(hdf, 'A_var')
+
+        row_ranges = None
+        if units != None:
+            unit_column = read_h5_frame(hdf, f'A_{split}', A_var, ["unit"])
+            row_ranges = unit_row_ranges(unit_column["unit"].to_numpy(), units)
+
+        # only the requested split, rows and columns are read from the file
+        df_X_s = read_h5_frame(
+            hdf, f'X_s_{split}', X_s_var, X_s_to_keep, row_ranges=row_ranges
+        )
+        df_X_v = read_h5_frame(
+            hdf, f'X_v_{split}', X_v_var, X_v_to_keep, row_ranges=row_ranges
+        )
+        df_A = read_h5_frame(
+            hdf, f'A_{split}', A_var, ["unit", "cycle", "hs"],
+            row_ranges=row_ranges,
+        )
+        df_W = read_h5_frame(hdf, f'W_{split}', W_var, W_var, row_ranges=row_ranges)
 
     df_X_s["unit"] = df_A["unit"].values
     df_X_s["cycle"] = df_A["cycle"].values
@@ -103,55 +102,308 @@ def read_in_data(
         all_data = all_data.loc[all_data["hs"] == 1]
 
     if frequency > 1:
-        all_data_shortened = pd.DataFrame(columns = all_data.columns)
-        for unit in np.unique(all_data["unit"]) :
-             data_unit = all_data.loc[all_data["unit"] == unit]
-             for flight in np.unique(data_unit["cycle"]):
-                data_flight = data_unit.loc[data_unit["cycle"] == flight]
-                data_flight.reset_index(inplace = True)
-
-                means = (
-                    data_flight
-                    .groupby(
-                        np.arange(len(data_flight)) // frequency
-                    )
-                    .mean()
-                )
-                all_data_shortened = pd.concat([all_data_shortened, means], axis = 0)
+        all_data_shortened = downsample_frequency(all_data, frequency)
         del all_data
-        all_data_shortened = all_data_shortened.drop(columns=["index"]).reset_index()
         return all_data_shortened, W_var
 
     return all_data, W_var
 
 
+def load_turbofan_data(
+    config_dataset: dict,
+    training_data: bool = True,
+    keep_all_data: bool = True,
+    filename: str = DATASET_PATH,
+    cache_directory: Optional[str] = CACHE_DIRECTORY,
+    units: Optional[List[int]] = None,
+) -> Tuple[pd.DataFrame, List[str]]:
+    """Read data through the preprocessing cache.
+
+    The output of `read_in_data` is stored under `cache_directory`, keyed by a
+    hash of the dataset configuration and of the identity of the h5 file, such
+    that subsequent runs with the same configuration skip reading and
+    downsampling the raw data.
+
+    Args:
+        config_dataset: the `dataset` section of the turbofan configuration.
+        training_data: boolean indicating whether the training or the testing
+            dataset is to be read in.
+        keep_all_data: boolean indicating whether to include only the healthy
+            flights from the dataset.
+        filename: raw data h5 file.
+        cache_directory: directory of the cache entries. If `None`, the data
+            is read from the h5 file without caching.
+        units: units whose rows are to be read. If `None`, the rows of all the
+            units are read.
+    """
+
+    def read():
+        return read_in_data(
+            filename, config_dataset["frequency"],
+            config_dataset["X_v_to_keep"], config_dataset["X_s_to_keep"],
+            training_data, keep_all_data, units,
+        )
+
+    if cache_directory == None:
+        return read()
+
+    key = frame_cache.cache_key(
+        CACHE_VERSION, config_dataset, frame_cache.source_identity(filename),
+        training_data, keep_all_data, units,
+    )
+
+    def create():
+        data, W_var = read()
+        return data, {"W_var": W_var}
+
+    data, metadata = frame_cache.cache_populate(
+        os.path.join(cache_directory, key), create
+    )
+    return data, metadata["W_var"]
+
+
+def read_last_flights(
+    filename: str,
+    training_data: bool = True,
+    keep_all_data: bool = True,
+) -> pd.DataFrame:
+    """Read the last flight of every unit from a raw data h5 file.
+
+    Only the `unit`, `cycle` and `hs` columns are read, such that the flights
+    of the whole fleet are known without reading any of its measurements.
+
+    Returns:
+        A DataFrame with one row per unit, ordered by unit, holding the `unit`
+        and the `cycle` of its last flight.
+    """
+
+    split = "dev" if training_data == True else "test"
+    with h5py.File(filename, 'r') as hdf:
+        A_var = read_h5_variables(hdf, 'A_var')
+        df_A = read_h5_frame(hdf, f'A_{split}', A_var, ["unit", "cycle", "hs"])
+
+    if keep_all_data == False:
+        df_A = df_A.loc[df_A["hs"] == 1]
+    return (
+        df_A.groupby("unit", sort=True)["cycle"].max()
+        .reset_index()
+    )
+
+
+def load_last_flights(
+    training_data: bool = True,
+    keep_all_data: bool = True,
+    filename: str = DATASET_PATH,
+    cache_directory: Optional[str] = CACHE_DIRECTORY,
+) -> Dict[float, int]:
+    """Read the last flight of every unit through the preprocessing cache.
+
+    Returns:
+        Dictionary holding for each unit, the number of its last flight.
+    """
+
+    def read():
+        return read_last_flights(filename, training_data, keep_all_data)
+
+    if cache_directory == None:
+        last_flights = read()
+    else:
+        key = frame_cache.cache_key(
+            CACHE_VERSION, "last_flights", frame_cache.source_identity(filename),
+            training_data, keep_all_data,
+        )
+        last_flights, _ = frame_cache.cache_populate(
+            os.path.join(cache_directory, key), lambda: (read(), {})
+        )
+    return {
+        unit: int(cycle)
+        for unit, cycle in zip(last_flights["unit"], last_flights["cycle"])
+    }
+
+
+def unit_row_ranges(unit_column: np.ndarray, units: List[int]) -> List[Tuple[int, int]]:
+    """Ranges `[start, stop)` of the consecutive rows belonging to `units`."""
+
+    selected = np.concatenate(([False], np.isin(unit_column, units), [False]))
+    edges = np.flatnonzero(selected[1:] != selected[:-1])
+    return [(int(start), int(stop)) for start, stop in edges.reshape(-1, 2)]
+
+
+def read_h5_variables(hdf: h5py.File, name: str) -> List[str]:
+    """Read the column names stored in the `name` dataset of an h5 file."""
+
+    # from np.array to list dtype U4/U5
+    return list(np.array(hdf[name][()], dtype='U20'))
+
+
+def read_h5_frame(
+    hdf: h5py.File,
+    name: str,
+    variables: List[str],
+    to_keep: List[str],
+    chunk_rows: int = H5_CHUNK_ROWS,
+    row_ranges: Optional[List[Tuple[int, int]]] = None,
+) -> pd.DataFrame:
+    """Read a subset of the columns of a 2D dataset of an h5 file.
+
+    The columns are selected in the file through h5py fancy indexing, and the
+    rows are read `chunk_rows` at a time into a preallocated array, such that
+    neither the discarded columns nor a full copy of the dataset are loaded
+    into memory.
+
+    Args:
+        hdf: open h5 file.
+        name: name of the dataset to be read, e.g. `X_s_dev`.
+        variables: names of all the columns of the dataset.
+        to_keep: names of the columns to be read, in the order in which they
+            are to appear in the returned DataFrame.
+        chunk_rows: number of rows to be read from the file at a time.
+        row_ranges: ranges `[start, stop)` of the rows to be read. If `None`,
+            all the rows are read.
+    """
+
+    dataset = hdf[name]
+    if row_ranges == None:
+        row_ranges = [(0, dataset.shape[0])]
+    nr_rows = sum(stop - start for start, stop in row_ranges)
+    columns = np.array([variables.index(column) for column in to_keep])
+    data = np.empty((nr_rows, len(columns)), dtype=dataset.dtype)
+
+    # h5py requires the selected columns to be increasing
+    order = np.argsort(columns)
+    if np.array_equal(columns, np.arange(len(variables))):
+        selection = slice(None)
+    else:
+        selection = list(columns[order])
+    offset = 0
+    for range_start, range_stop in row_ranges:
+        for start in range(range_start, range_stop, chunk_rows):
+            stop = min(start + chunk_rows, range_stop)
+            data[offset:(offset + stop - start), order] = dataset[start:stop, selection]
+            offset += stop - start
+    return DataFrame(data=data, columns=to_keep)
+
+
+def downsample_frequency(all_data: pd.DataFrame, frequency: int) -> pd.DataFrame:
+    """Average every `frequency` consecutive samples of each flight.
+
+    The rows are ordered by (unit, cycle) with a stable sort, such that the
+    samples of a flight keep their original order. Every flight is then split
+    into buckets of `frequency` samples, counted from the first sample of the
+    flight, and each bucket is reduced to its mean in a single pass over the
+    whole array.
+
+    Args:
+        all_data: DataFrame with the flight samples, holding at least the
+            `unit` and `cycle` columns.
+        frequency: by how many samples the original dataset is to be aggregated.
+
+    Returns:
+        A DataFrame with one row per bucket, ordered by unit, flight and
+        bucket. The `index` column holds the position of the bucket within its
+        flight.
+    """
+
+    values = all_data.to_numpy(dtype=np.float64)
+    units = all_data["unit"].to_numpy()
+    cycles = all_data["cycle"].to_numpy()
+
+    order = np.lexsort((cycles, units))
+    values, units, cycles = values[order], units[order], cycles[order]
+
+    nr_rows = values.shape[0]
+    flight_starts = np.flatnonzero(np.concatenate((
+        [True], (units[1:] != units[:-1]) | (cycles[1:] != cycles[:-1])
+    )))
+    flight_lengths = np.diff(np.append(flight_starts, nr_rows))
+    position = np.arange(nr_rows) - np.repeat(flight_starts, flight_lengths)
+
+    bucket_starts = np.flatnonzero(position % frequency == 0)
+    bucket_lengths = np.diff(np.append(bucket_starts, nr_rows))
+    means = np.add.reduceat(values, bucket_starts, axis=0)
+    means /= bucket_lengths[:, np.newaxis]
+
+    all_data_shortened = DataFrame(data=means, columns=all_data.columns)
+    all_data_shortened.insert(
+        0, "index", np.float64(position[bucket_starts] // frequency)
+    )
+    return all_data_shortened
+
+
 def min_max_training(training_data, skip = ["cycle", "unit" , "hs"]):
-    minima = {}
-    maxima = {}
-    for column in training_data.columns:
-        if column in skip:
-            continue
-        minimum = training_data[[column]].min()[column]
-        maximum = training_data[[column]].max()[column]
-        minima[column] = minimum
-        maxima[column] = maximum
+    columns = [column for column in training_data.columns if column not in skip]
+    minima = training_data[columns].min().to_dict()
+    maxima = training_data[columns].max().to_dict()
     return minima, maxima
 
 def normalization(data, minima, maxima, skip = ["cycle", "unit" , "hs"]):
-    for column in data.columns:
-        if column in skip:
-            continue
-        # normalize between -1 and 1
-        u = 1
-        l = -1
-        minimum = minima.get(column)
-        maximum = maxima.get(column)
-
-        data.loc[:, column] = (
-            (data.loc[:, column] - minimum)*(u-l)/(maximum-minimum)+l
-        )
+    columns = [
+        column for column in data.columns
+        if (column not in skip) and (column in minima)
+    ]
+    # normalize between -1 and 1
+    u = 1
+    l = -1
+    # one float block of the columns, rescaled in place and written back
+    values = data[columns].to_numpy(dtype=np.float64)
+    normalization_features(values, columns, minima, maxima, u, l)
+    data[columns] = values
     return data
 
+def min_max_features(
+    features: np.ndarray, columns: List[str]
+) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Minima and maxima of each column of a feature matrix.
+
+    Args:
+        features: matrix with one row per sample and one column per entry of
+            `columns`.
+        columns: names of the columns of `features`.
+    """
+
+    minima = features.min(axis=0)
+    maxima = features.max(axis=0)
+    return dict(zip(columns, minima)), dict(zip(columns, maxima))
+
+def normalization_features(
+    features: np.ndarray,
+    columns: List[str],
+    minima: Dict[str, float],
+    maxima: Dict[str, float],
+    u: float = 1,
+    l: float = -1,
+) -> np.ndarray:
+    """Normalize each column of a feature matrix between `l` and `u`, in
+    place."""
+
+    minimum = np.array([minima[column] for column in columns])
+    maximum = np.array([maxima[column] for column in columns])
+    features -= minimum
+    features *= (u-l)
+    features /= (maximum-minimum)
+    features += l
+    return features
+
+def min_max_store(file_path, minima, maxima):
+    """Store the minima and maxima dictionaries in an npz file."""
+
+    columns = list(minima)
+    np.savez(
+        file_path,
+        columns=np.array(columns, dtype=str),
+        minima=np.array([minima[column] for column in columns]),
+        maxima=np.array([maxima[column] for column in columns]),
+    )
+
+def min_max_load(file_path):
+    """Load the minima and maxima dictionaries stored by `min_max_store`."""
+
+    with np.load(file_path) as stored:
+        columns = [str(column) for column in stored["columns"]]
+        minima = dict(zip(columns, stored["minima"]))
+        maxima = dict(zip(columns, stored["maxima"]))
+    return minima, maxima
+
 
 class CreatorCNNTurbofanIsolated(FactoryModelDatasets):
 
@@ -175,10 +427,7 @@ class CreatorCNNTurbofanIsolated(FactoryModelDatasets):
         validation_size = config_dataset["validation_size"]
         ENGINE = int(os.getenv("ENGINE", "2.0"))
 
-        df_turbofan, all_fc = read_in_data(
-            "data/raw/turbofan_simulation/data_set2/N-CMAPSS_DS02-006.h5",
-            frequency, X_v_to_keep, X_s_to_keep, True, True
-        )
+        df_turbofan, all_fc = load_turbofan_data(config_dataset, True, True)
         df_turbofan = df_turbofan.drop(columns = ["hs"])
         all_variables_x = X_v_to_keep + X_s_to_keep + all_fc
         units = np.unique(df_turbofan.loc[:, "unit"])
@@ -219,10 +468,7 @@ class CreatorCNNTurbofanIsolated(FactoryModelDatasets):
             train_total_minima, train_total_maxima
         )
 
-        df_turbofan_test, _ = read_in_data(
-            "data/raw/turbofan_simulation/data_set2/N-CMAPSS_DS02-006.h5",
-            frequency, X_v_to_keep, X_s_to_keep, False, True
-        )
+        df_turbofan_test, _ = load_turbofan_data(config_dataset, False, True)
         df_turbofan_test = df_turbofan_test.drop(columns = ["hs"])
         test_units = np.unique(df_turbofan_test.loc[:, "unit"])
 
@@ -259,7 +505,14 @@ class CreatorCNNTurbofan(FactoryModelDatasets):
         else: 
             self.model_config = model_config
 
-    def create_model_datasets(self, neural=None):
+    def create_model_datasets(self, neural=None, test_min_max=None):
+        """Create the model and the datasets.
+
+        The test dataset is normalized with `test_min_max`, the minima and
+        maxima stored with a trained model by `min_max_store`, if given, and
+        otherwise with those of the training dataset.
+        """
+
         config_turbofan = deepcopy(self.model_config)
         config_dataset = config_turbofan["dataset"]
         config_model = config_turbofan["models"][0]
@@ -270,10 +523,7 @@ class CreatorCNNTurbofan(FactoryModelDatasets):
         frequency = config_dataset["frequency"]
         validation_size = config_dataset["validation_size"]
 
-        df_turbofan, all_fc = read_in_data(
-            "data/raw/turbofan_simulation/data_set2/N-CMAPSS_DS02-006.h5",
-            frequency, X_v_to_keep, X_s_to_keep, True, True
-        )
+        df_turbofan, all_fc = load_turbofan_data(config_dataset, True, True)
         df_turbofan = df_turbofan.drop(columns = ["hs"])
         all_variables_x = X_v_to_keep + X_s_to_keep + all_fc
         units = np.unique(df_turbofan.loc[:, "unit"])
@@ -303,10 +553,7 @@ class CreatorCNNTurbofan(FactoryModelDatasets):
             train_minima, train_maxima
         )
 
-        df_turbofan_test, _ = read_in_data(
-            "data/raw/turbofan_simulation/data_set2/N-CMAPSS_DS02-006.h5",
-            frequency, X_v_to_keep, X_s_to_keep, False, True
-        )
+        df_turbofan_test, _ = load_turbofan_data(config_dataset, False, True)
         df_turbofan_test = df_turbofan_test.drop(columns = ["hs"])
         test_units = np.unique(df_turbofan_test.loc[:, "unit"])
 
@@ -316,9 +563,10 @@ class CreatorCNNTurbofan(FactoryModelDatasets):
             all_flights = list(range(1, last_flight+1, 1))
             dict_test_flights[unit] = all_flights
 
+        test_minima, test_maxima = test_min_max or (train_minima, train_maxima)
         dataset_test = TurbofanSimulationDataset(
             df_turbofan_test, stepsize_sample, all_variables_x,
-            considered_length, dict_test_flights, train_minima, train_maxima
+            considered_length, dict_test_flights, test_minima, test_maxima
         )
 
         neural = neural if neural != None else CNNRUL(config_model, "Unit")
@@ -377,21 +625,24 @@ class CreatorCNNEngine(FactoryModelDatasets):
         FAULTY = bool(int(os.getenv("FAULTY", "0")))
         FAULTY_CLIENT = json.loads(os.getenv("FAULTY_CLIENT", "[]"))
         NOISE_AMPLITUDE = float(os.getenv("NOISE_AMPLITUDE", "0"))
+        FAULT_MODEL = os.getenv("FAULT_MODEL", "gaussian")
+        NOISE_SEED = int(os.getenv("NOISE_SEED", "0"))
         faulty = FAULTY and (ENGINE in FAULTY_CLIENT)
         logger_console.info(f"Client engine: {ENGINE}")
 
-        df_turbofan, all_fc = read_in_data(
-            "data/raw/turbofan_simulation/data_set2/N-CMAPSS_DS02-006.h5",
-            frequency, X_v_to_keep, X_s_to_keep, True, True
+        # only the rows of the client's engine are read, while the flights of
+        # every unit are still drawn, so the split matches the fleet's
+        df_turbofan, all_fc = load_turbofan_data(
+            config_dataset, True, True, units=[ENGINE]
         )
         df_turbofan = df_turbofan.drop(columns = ["hs"])
         all_variables_x = X_v_to_keep + X_s_to_keep + all_fc
+        last_flights = load_last_flights(True, True)
 
         dict_training_flights = {}
         dict_validation_flights = {}
 
-        for unit in np.unique(df_turbofan.loc[:, "unit"]):
-            last_flight = int(max(df_turbofan.loc[df_turbofan["unit"] == unit, "cycle"]))
+        for unit, last_flight in last_flights.items():
             all_flights = list(range(1, last_flight + 1, 1))
             validation_flights = np.random.choice(
                 np.array(all_flights), size=math.floor(validation_size * len(all_flights)), replace=False
@@ -404,7 +655,8 @@ class CreatorCNNEngine(FactoryModelDatasets):
         dataset_train = EngineSimulationDataset(
             ENGINE, df_turbofan, stepsize_sample, all_variables_x,
             considered_length, dict_training_flights, faulty=faulty,
-            relative_noise=NOISE_AMPLITUDE,
+            relative_noise=NOISE_AMPLITUDE, fault_model=FAULT_MODEL,
+            rng=np.random.default_rng([NOISE_SEED, ENGINE]),
         )
         train_minima, train_maxima = dataset_train.minima, dataset_train.maxima
         dataset_valid = EngineSimulationDataset(
@@ -468,44 +720,136 @@ class TurbofanSimulationDataset(Dataset):
             dict_maxima: dictionary of the maxima for each column.
         """
 
-        self.all_data = all_data.copy()
+        # sample streams are addressed by row position
+        self.all_data = all_data.reset_index(drop=True)
         self.all_variables_x = all_variables_x
         self.considered_length = considered_length
 
-        self.sample_index = []
+        self.sample_index = np.empty((0, 2), dtype=np.int64)
         self.unit_flight_sample_indices = {}
 
         self._create_samples(considered_flights, stepsize_sample, considered_length)
         self._pre_processing(dict_minima, dict_maxima)
+        self._create_arrays()
+        del self.all_data
 
     def _create_samples(
         self, considered_flights: dict, stepsize_sample: int, considered_length: int
     ):
-        for unit in np.unique(self.all_data["unit"]):
-            data_engine = self.all_data.loc[self.all_data["unit"] == unit, :]
-            flights = np.unique(data_engine["cycle"])
-            nr_flights = len(flights)
-
-            for flight in flights:
-                if flight not in considered_flights[unit]:
-                    continue
-                data_flight = data_engine.loc[data_engine["cycle"] == flight]
-                nr_samples = data_flight.shape[0]
-                nr_streams = (nr_samples - considered_length)//stepsize_sample + 1
-                for i in range(nr_streams):
-                    self.sample_index.append((
-                        data_flight.index[0]+i*stepsize_sample,
-                        nr_flights - flight,
-                    ))
-                self._add_flight_indices(
-                    unit, flight,
-                    [len(self.sample_index)-nr_streams, len(self.sample_index)]
-                )
+        """Create the index of the sample streams of the considered flights.
+
+        The flights are the runs of consecutive rows with the same unit and
+        cycle. `sample_index` holds one row per sample stream with its first
+        row position and its RUL, ordered by unit, flight and position.
+        """
+
+        units = self.all_data["unit"].to_numpy()
+        cycles = self.all_data["cycle"].to_numpy()
+        nr_rows = units.shape[0]
+
+        flight_starts = np.flatnonzero(np.concatenate((
+            [True], (units[1:] != units[:-1]) | (cycles[1:] != cycles[:-1])
+        )))
+        flight_lengths = np.diff(np.append(flight_starts, nr_rows))
+        flight_units, flight_cycles = units[flight_starts], cycles[flight_starts]
+        order = np.lexsort((flight_cycles, flight_units))
+        flight_starts, flight_lengths = flight_starts[order], flight_lengths[order]
+        flight_units, flight_cycles = flight_units[order], flight_cycles[order]
+
+        unique_units, nr_flights = np.unique(flight_units, return_counts=True)
+        considered = np.zeros(flight_starts.shape[0], dtype=bool)
+        for unit in unique_units:
+            flights_unit = flight_units == unit
+            considered[flights_unit] = np.isin(
+                flight_cycles[flights_unit], list(considered_flights[unit])
+            )
+        flight_ruls = (
+            nr_flights[np.searchsorted(unique_units, flight_units)] - flight_cycles
+        )
+
+        nr_streams = (flight_lengths - considered_length)//stepsize_sample + 1
+        nr_streams = np.where(considered, np.maximum(nr_streams, 0), 0)
+        stream_offsets = np.concatenate(([0], np.cumsum(nr_streams)))
+        stream_flights = np.repeat(np.arange(flight_starts.shape[0]), nr_streams)
+        stream_positions = np.arange(stream_offsets[-1]) - stream_offsets[stream_flights]
+
+        self.sample_index = np.empty((stream_offsets[-1], 2), dtype=np.int64)
+        self.sample_index[:, 0] = (
+            flight_starts[stream_flights] + stream_positions*stepsize_sample
+        )
+        self.sample_index[:, 1] = flight_ruls[stream_flights]
+
+        for flight in np.flatnonzero(considered):
+            self._add_flight_indices(
+                flight_units[flight], flight_cycles[flight],
+                [int(stream_offsets[flight]), int(stream_offsets[flight + 1])]
+            )
+
+    def _feature_values(self) -> np.ndarray:
+        """Float64 array with the columns of `all_variables_x` of `all_data`."""
+
+        return np.column_stack([
+            self.all_data[column].to_numpy(dtype=np.float64)
+            for column in self.all_variables_x
+        ])
+
     def _pre_processing(self, minima, maxima):
+        values = self._feature_values()
         if (not minima) or (not maxima):
-            minima, maxima = min_max_training(self.all_data)
+            minima, maxima = min_max_features(values, self.all_variables_x)
         self.__minima, self.__maxima = minima, maxima
-        self.all_data = normalization(self.all_data, self.__minima, self.__maxima)
+        normalization_features(values, self.all_variables_x, minima, maxima)
+        self.features = np.ascontiguousarray(values, dtype=np.float32)
+
+    def _create_arrays(self):
+        """Hold the features and labels as contiguous float32 arrays.
+
+        `features` holds one row per sample of `all_data`, with the normalized
+        columns of `all_variables_x`, and `targets` holds the RUL of each
+        sample stream. Sample streams are returned as views over these arrays.
+        """
+
+        self._features = torch.from_numpy(self.features)
+        self._targets = torch.from_numpy(self.sample_index[:, 1].astype(np.float32))
+        self._sample_index = torch.from_numpy(self.sample_index)
+        self._window_offsets = torch.arange(self.considered_length)
+        self._create_views()
+
+    def _create_views(self):
+        """Expose the tensors of the dataset as read-only numpy views."""
+
+        self.features = self._features.numpy()
+        self.targets = self._targets.numpy()
+        self.sample_index = self._sample_index.numpy()
+        for array in (self.features, self.targets, self.sample_index):
+            array.flags.writeable = False
+        self._starts = self._sample_index[:, 0]
+
+    def share_memory(self):
+        """Move the arrays of the dataset to shared memory.
+
+        DataLoader workers then map the same pages as the main process, instead
+        of each holding a copy of the features, so the memory of a client does
+        not grow with the number of workers. The numpy attributes remain
+        read-only views over the shared tensors.
+        """
+
+        for tensor in (self._features, self._targets, self._sample_index):
+            tensor.share_memory_()
+        self._create_views()
+        return self
+
+    def __getstate__(self):
+        # the numpy views are rebuilt from the tensors, which are passed to
+        # spawned workers as handles to their shared memory
+        state = self.__dict__.copy()
+        for view in ("features", "targets", "sample_index", "_starts"):
+            del state[view]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_views()
 
     def _add_flight_indices(self, engine, flight, indices):
         if engine not in self.unit_flight_sample_indices:
@@ -542,44 +886,86 @@ class TurbofanSimulationDataset(Dataset):
         specified by `idx`.
         """
 
-        start, RUL = self.sample_index[idx]
-        sample_x = self.all_data.loc[
-            (start):(start + self.considered_length-1),
-            self.all_variables_x
-        ]
-        sample_x = sample_x.to_numpy()
-        sample_x = np.float32(sample_x)
+        if isinstance(idx, (list, np.ndarray, torch.Tensor)):
+            return self.get_batch(idx)
+        start, _ = self.sample_index[idx]
         return (
-            torch.from_numpy(sample_x).unsqueeze(0),
-            torch.from_numpy(np.array(np.float32(RUL))).unsqueeze(0)
+            self._features[start:(start + self.considered_length)].unsqueeze(0),
+            self._targets[idx].unsqueeze(0),
+        )
+
+    def get_batch(self, indices):
+        """Get the entries at the positions specified by `indices`.
+
+        The sample streams are gathered with a single indexing operation over
+        the feature array, and are returned with the same shapes as the
+        DataLoader's default collation of single entries: `(B, 1, L, F)` for
+        the inputs and `(B, 1)` for the targets.
+        """
+
+        indices = torch.as_tensor(indices, dtype=torch.int64)
+        windows = self._starts[indices].unsqueeze(1) + self._window_offsets
+        return (
+            self._features[windows].unsqueeze(1),
+            self._targets[indices].unsqueeze(1),
         )
 
 
 class EngineSimulationDataset(TurbofanSimulationDataset):
 
 
-    def __init__(self, engine, all_data, *args, faulty=False, relative_noise=0.5, **kwargs):
+    def __init__(
+        self, engine, all_data, *args, faulty=False, relative_noise=0.5,
+        fault_model="gaussian", rng=None, **kwargs
+    ):
         self.engine = engine
-        all_data = all_data.loc[all_data["unit"] == engine, :].copy()
+        self.fault_model = None
         if faulty == True:
-            all_data = self.add_noise(all_data, relative_noise)
+            self.fault_model = faults.fault_model_create(fault_model, relative_noise)
+        self.rng = rng if rng != None else np.random.default_rng()
+        all_data = all_data.loc[all_data["unit"] == engine, :]
         super().__init__(all_data, *args, **kwargs)
 
-    def add_noise(self, df, relative_noise, ignore=set(["unit", "cycle"])): 
-        logger_console.info(
-            f"Adding noise to engine data. std: `{relative_noise}`"
-        )
-        col_std = df.std()
-        assert isinstance(col_std, pd.Series)
-        for idx, std_dev in col_std.items(): 
-            if idx in ignore: 
-                continue
-            nrows = len(df.loc[:, idx])
-            df.loc[:, idx] += np.random.normal(
-                0, std_dev*relative_noise, nrows
-            )
-        return df
+    def _feature_values(self):
+        values = super()._feature_values()
+        if self.fault_model != None:
+            self.add_noise(values)
+        return values
+
+    def add_noise(self, values):
+        """Corrupt the features in place with the fault model of the engine.
+
+        The features are corrupted before the minima and maxima are computed,
+        as the measurements of a faulty client would be.
+        """
+
+        logger_console.info(f"Adding noise to engine data: `{self.fault_model}`")
+        self.fault_model.apply(values, self.rng)
+
+
+def batch_dataloader(
+    dataset: TurbofanSimulationDataset,
+    batch_size: int,
+    shuffle: bool = False,
+    num_workers: int = 0,
+) -> DataLoader:
+    """DataLoader fetching whole batches from the dataset at a time.
+
+    Each batch of indices produced by the sampler is passed to the dataset in
+    a single call, which gathers all the sample streams at once, instead of
+    fetching every sample separately and collating them. With workers, the
+    dataset is first moved to shared memory, which the workers attach to.
+    """
 
+    if num_workers > 0:
+        dataset.share_memory()
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(
+        dataset,
+        sampler=BatchSampler(sampler, batch_size, drop_last=False),
+        batch_size=None,
+        num_workers=num_workers,
+    )
 
 def validate(neural, dataloader_validation): 
     import tqdm
@@ -0,0 +1,81 @@
+import os
+import time
+import json
+import logging
+
+import numpy as np
+import torch
+
+import config
+from models.turbofan import (
+    TurbofanSimulationDataset, load_turbofan_data, normalization
+)
+
+
+logger = logging.getLogger(__name__)
+
+NR_SAMPLES = 20000
+
+def persist_json(json_serializable, file_path):
+    with open(file_path, "w") as f:
+        json.dump(json_serializable, f)
+
+def getitem_frame(all_data, dataset, idx):
+    """Reference implementation, one `.loc` slice per sample stream."""
+
+    start, RUL = dataset.sample_index[idx]
+    sample_x = all_data.loc[
+        (start):(start + dataset.considered_length-1),
+        dataset.all_variables_x
+    ]
+    sample_x = sample_x.to_numpy()
+    sample_x = np.float32(sample_x)
+    return (
+        torch.from_numpy(sample_x).unsqueeze(0),
+        torch.from_numpy(np.array(np.float32(RUL))).unsqueeze(0)
+    )
+
+def samples_per_second(getitem, indices):
+    start = time.time()
+    for idx in indices:
+        getitem(idx)
+    return len(indices)/(time.time() - start)
+
+def main():
+    dataset_config = config.model_config["dataset"]
+    all_data, W_var = load_turbofan_data(dataset_config, True, True)
+    all_data = all_data.drop(columns = ["hs"]).reset_index(drop=True)
+    all_variables_x = (
+        dataset_config["X_v_to_keep"] + dataset_config["X_s_to_keep"] + W_var
+    )
+    considered_flights = {
+        unit: set(np.unique(all_data.loc[all_data["unit"] == unit, "cycle"]))
+        for unit in np.unique(all_data["unit"])
+    }
+    dataset = TurbofanSimulationDataset(
+        all_data, dataset_config["stepsize_sample"], all_variables_x,
+        dataset_config["considered_length"], considered_flights,
+    )
+    all_data = normalization(all_data.copy(), dataset.minima, dataset.maxima)
+
+    indices = np.random.randint(0, len(dataset), NR_SAMPLES)
+    for idx in indices[:100]:
+        sample_x, _ = dataset[idx]
+        sample_x_frame, _ = getitem_frame(all_data, dataset, idx)
+        assert torch.equal(sample_x, sample_x_frame)
+
+    frame = samples_per_second(
+        lambda idx: getitem_frame(all_data, dataset, idx), indices
+    )
+    array = samples_per_second(dataset.__getitem__, indices)
+    logger.info(
+        f"Samples/sec\tframe: {frame:.0f}\tarray: {array:.0f}\t"
+        f"speedup: {array/frame:.1f}x"
+    )
+    persist_json(
+        {"samples": NR_SAMPLES, "frame": frame, "array": array},
+        os.path.join(config.evaluation_directory, "benchmark_dataset.json")
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import time
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+
+import config
+from models.turbofan import read_in_data, downsample_frequency, DATASET_PATH
+
+
+logger = logging.getLogger(__name__)
+
+FREQUENCIES = [1, 2, 5, 10, 20]
+
+def persist_json(json_serializable, file_path):
+    with open(file_path, "w") as f:
+        json.dump(json_serializable, f)
+
+def downsample_frequency_loop(all_data, frequency):
+    """Reference implementation, one groupby per (unit, flight)."""
+
+    all_data_shortened = pd.DataFrame(columns = all_data.columns)
+    for unit in np.unique(all_data["unit"]) :
+        data_unit = all_data.loc[all_data["unit"] == unit]
+        for flight in np.unique(data_unit["cycle"]):
+            data_flight = data_unit.loc[data_unit["cycle"] == flight]
+            data_flight.reset_index(inplace = True)
+
+            means = (
+                data_flight
+                .groupby(
+                    np.arange(len(data_flight)) // frequency
+                )
+                .mean()
+            )
+            all_data_shortened = pd.concat([all_data_shortened, means], axis = 0)
+    return all_data_shortened.drop(columns=["index"]).reset_index()
+
+def main():
+    dataset_config = config.model_config["dataset"]
+    all_data, _ = read_in_data(
+        DATASET_PATH, 1, dataset_config["X_v_to_keep"],
+        dataset_config["X_s_to_keep"], True, True
+    )
+    logger.info(f"Rows: {all_data.shape[0]}")
+
+    results = []
+    for frequency in FREQUENCIES:
+        start = time.time()
+        vectorized = downsample_frequency(all_data, frequency)
+        time_vectorized = time.time() - start
+
+        start = time.time()
+        loop = downsample_frequency_loop(all_data, frequency)
+        time_loop = time.time() - start
+
+        equal = (
+            list(vectorized.columns) == list(loop.columns)
+            and np.allclose(
+                vectorized.to_numpy(dtype=np.float64),
+                loop.to_numpy(dtype=np.float64),
+            )
+        )
+        logger.info(
+            f"frequency={frequency}\tloop: {time_loop:.3f}s\t"
+            f"vectorized: {time_vectorized:.3f}s\tequal: {equal}"
+        )
+        results.append({
+            "frequency": frequency,
+            "rows": vectorized.shape[0],
+            "loop": time_loop,
+            "vectorized": time_vectorized,
+            "equal": bool(equal),
+        })
+    persist_json(
+        results, os.path.join(config.evaluation_directory, "benchmark_downsampling.json")
+    )
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ import json
 
 import config
 
-from distributed_learning.server import SplitFedServer
+from distributed_learning.engines import server_create
 from models.turbofan import (
     CreatorCNNEngine, compute_rmse_mae, test, FileCNNRULStruct,
     equivalent_config_cnnrul, model_recreate_cnnrul, improved_validation_cnnrul
@@ -53,8 +53,8 @@ def main():
     creator = CreatorCNNEngine(model_config=model_config, neural_network=neural)
     nn_unit = creator.neural_network
     nn_server_creator = creator.nn_server_create
-    server = SplitFedServer(
-        '0.0.0.0', config.SERVER_PORT, nn_unit, torch.optim.Adam,
+    server = server_create(
+        config.SERVER_ENGINE, '0.0.0.0', config.SERVER_PORT, nn_unit, torch.optim.Adam,
         torch.nn.MSELoss(), nn_server_creator, config.split_layer
     )
     server.optimizer(lr=config.LR)
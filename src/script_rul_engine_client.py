@@ -4,13 +4,11 @@ import multiprocessing
 import logging
 import sys
 
-from torch.utils.data import DataLoader
-
 import config
 
 from distributed_learning import utils
 from distributed_learning.client import SplitFedClient
-from models.turbofan import CreatorCNNEngine 
+from models.turbofan import CreatorCNNEngine, batch_dataloader
 
 
 logger = logging.getLogger(__name__)
@@ -29,11 +27,11 @@ cpu_count = multiprocessing.cpu_count()
 creator = CreatorCNNEngine()
 neural_client, training_partitions = creator.create_model_datasets(split_layer)
 dataset_train, dataset_validate = training_partitions["train"], training_partitions["validation"]
-dataloader_train = DataLoader(
-    dataset_train, batch_size=config.B, shuffle=True, num_workers=cpu_count
+dataloader_train = batch_dataloader(
+    dataset_train, config.B, shuffle=True, num_workers=cpu_count
 )
-dataloader_validate = DataLoader(
-    dataset_validate, batch_size=config.B, shuffle=False, num_workers=cpu_count
+dataloader_validate = batch_dataloader(
+    dataset_validate, config.B, shuffle=False, num_workers=cpu_count
 )
 
 logger.info('Create Client')
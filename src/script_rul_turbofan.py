@@ -5,13 +5,13 @@ import logging
 import yaml
 import json
 import time
-from torch.utils.data import DataLoader
 from typing import Optional
 
 import config
 from models.turbofan import (
     CreatorCNNTurbofan, train_one_epoch, validate, FileCNNRULStruct,
-    model_recreate_cnnrul, improved_validation_cnnrul, equivalent_config_cnnrul
+    model_recreate_cnnrul, improved_validation_cnnrul, equivalent_config_cnnrul,
+    batch_dataloader, min_max_store,
 )
 from models import file_model
 
@@ -48,16 +48,17 @@ def main():
     model_path = os.path.join(program_directory, "model.pkl")
     training_time_path = os.path.join(program_directory, "training_time.json")
     validations_path = os.path.join(program_directory, "validations.json")
+    min_max_path = os.path.join(program_directory, "min_max.npz")
     persisted_model, neural = load_persisted_model(model_config, model_path)
 
     cpu_count = multiprocessing.cpu_count()
     creator = CreatorCNNTurbofan(model_config=model_config)
     neural, datasets = creator.create_model_datasets(neural)
-    dataloader_train = DataLoader(
-        datasets["train"], batch_size=config.B, shuffle=True, num_workers=cpu_count
+    dataloader_train = batch_dataloader(
+        datasets["train"], config.B, shuffle=True, num_workers=cpu_count
     )
-    dataloader_validation = DataLoader(
-        datasets["validation"], batch_size=config.B, shuffle=True, num_workers=cpu_count
+    dataloader_validation = batch_dataloader(
+        datasets["validation"], config.B, shuffle=True, num_workers=cpu_count
     )
     optimizer = torch.optim.Adam(neural.parameters(), lr=config.LR)
     loss_criterion = torch.nn.MSELoss()
@@ -83,6 +84,11 @@ def main():
         if (persisted_model == None) or improved_validation_cnnrul(persisted_model, candidate_model): 
             logger.info(f"Store candidate. Validation Results: {loss_validation}")
             file_model.file_store(model_path, candidate_model)
+            # the test dataset is normalized with the statistics of the
+            # training dataset of the stored model
+            min_max_store(
+                min_max_path, datasets["train"].minima, datasets["train"].maxima
+            )
             persisted_model = candidate_model
 
 if __name__ == "__main__": 
@@ -5,12 +5,12 @@ import logging
 import yaml
 import json
 import time
-from torch.utils.data import DataLoader
 
 import config
 from models.turbofan import (
     CreatorCNNTurbofanIsolated, train_one_epoch, validate, FileCNNRULStruct,
-    model_recreate_cnnrul, improved_validation_cnnrul, equivalent_config_cnnrul
+    model_recreate_cnnrul, improved_validation_cnnrul, equivalent_config_cnnrul,
+    batch_dataloader,
 )
 from models import file_model
 
@@ -52,14 +52,14 @@ def main():
     cpu_count = multiprocessing.cpu_count()
     creator = CreatorCNNTurbofanIsolated(model_config=model_config)
     neural, datasets = creator.create_model_datasets(neural)
-    dataloader_train = DataLoader(
-        datasets["train"], batch_size=config.B, shuffle=True, num_workers=cpu_count
+    dataloader_train = batch_dataloader(
+        datasets["train"], config.B, shuffle=True, num_workers=cpu_count
     )
-    dataloader_validation = DataLoader(
-        datasets["validation"], batch_size=config.B, shuffle=True, num_workers=cpu_count
+    dataloader_validation = batch_dataloader(
+        datasets["validation"], config.B, shuffle=True, num_workers=cpu_count
     )
-    dataloader_validation_total = DataLoader(
-        datasets["validation_total"], batch_size=config.B, shuffle=True, num_workers=cpu_count
+    dataloader_validation_total = batch_dataloader(
+        datasets["validation_total"], config.B, shuffle=True, num_workers=cpu_count
     )
     optimizer = torch.optim.Adam(neural.parameters(), lr=config.LR)
     loss_criterion = torch.nn.MSELoss()
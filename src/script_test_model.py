@@ -6,7 +6,7 @@ import json
 import config
 from models import file_model
 from models.turbofan import (
-    model_recreate_cnnrul, test_per_flight, CreatorCNNTurbofan
+    model_recreate_cnnrul, test_per_flight, CreatorCNNTurbofan, min_max_load
 )
 
 def persist_json(json_serializable, file_path): 
@@ -29,8 +29,10 @@ def main():
         logger.info(f"Missing persisted model {model_path}")
         return
 
+    min_max_path = os.path.join(directory_path, "min_max.npz")
+    test_min_max = min_max_load(min_max_path) if os.path.isfile(min_max_path) else None
     _, datasets = CreatorCNNTurbofan(model_config=persisted_model.model_config_context)\
-        .create_model_datasets(neural=neural)
+        .create_model_datasets(neural=neural, test_min_max=test_min_max)
     test_predicted_path = os.path.join(directory_path, "predicted_real.json")
     test_metrics_path = os.path.join(directory_path, "test_metrics.json")
     rmse, mae = test_per_flight(neural, datasets["test"], test_predicted_path)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+
+# the modules are imported from src, and read their configuration relative to
+# it, as the scripts do
+SRC_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIRECTORY)
+os.chdir(SRC_DIRECTORY)
@@ -0,0 +1,162 @@
+import collections
+
+import pytest
+import torch
+
+from distributed_learning import aggregation
+
+
+def state_dicts(nr_clients: int):
+    generator = torch.Generator().manual_seed(0)
+    return [
+        collections.OrderedDict([
+            ("conv.weight", torch.randn((8, 4, 3), generator=generator)),
+            ("conv.bias", torch.randn(8, generator=generator)),
+            ("bn.num_batches_tracked", torch.tensor(client)),
+            ("fc.weight", torch.randn((1, 16), generator=generator)),
+        ])
+        for client in range(nr_clients)
+    ]
+
+
+def weighted_sum(weighted_state_dicts):
+    """Plain weighted sum of the floating point entries, with the other entries
+    of the last state_dict."""
+
+    result = collections.OrderedDict()
+    for key, tensor in weighted_state_dicts[-1][0].items():
+        if tensor.is_floating_point():
+            tensor = sum(weight*state_dict[key] for state_dict, weight in weighted_state_dicts)
+        result[key] = tensor
+    return result
+
+
+def assert_state_dict_close(state_dict, other):
+    assert list(state_dict) == list(other)
+    for key in state_dict:
+        assert state_dict[key].shape == other[key].shape
+        torch.testing.assert_close(state_dict[key], other[key])
+
+
+WEIGHTS = [0.1, 0.5, 0.15, 0.25]
+
+
+def test_weighted_average():
+    weighted_state_dicts = list(zip(state_dicts(4), WEIGHTS))
+
+    assert_state_dict_close(
+        aggregation.weighted_average(weighted_state_dicts),
+        weighted_sum(weighted_state_dicts),
+    )
+
+
+def test_flat_aggregation():
+    clients = state_dicts(4)
+    flat_aggregation = aggregation.FlatAggregation(clients[0], len(clients))
+    for state_dict in reversed(clients):
+        flat_aggregation.add(state_dict)
+    weighted_state_dicts = list(zip(clients, WEIGHTS))
+
+    assert_state_dict_close(
+        flat_aggregation.weighted_average(weighted_state_dicts),
+        weighted_sum(weighted_state_dicts),
+    )
+    # a subset of the clients, e.g. without those that were cut off
+    assert_state_dict_close(
+        flat_aggregation.weighted_average(weighted_state_dicts[1:3]),
+        weighted_sum(weighted_state_dicts[1:3]),
+    )
+
+
+def test_flat_aggregation_reuses_the_previous_matrix():
+    clients = state_dicts(4)
+    previous = aggregation.FlatAggregation(clients[0], len(clients))
+    for state_dict in clients:
+        previous.add(state_dict)
+
+    flat_aggregation = aggregation.FlatAggregation(clients[0], 2, previous)
+    for state_dict in clients[2:]:
+        flat_aggregation.add(state_dict)
+    weighted_state_dicts = list(zip(clients[2:], [0.3, 0.7]))
+
+    assert flat_aggregation.matrix.data_ptr() == previous.matrix.data_ptr()
+    assert_state_dict_close(
+        flat_aggregation.weighted_average(weighted_state_dicts),
+        weighted_sum(weighted_state_dicts),
+    )
+
+
+def test_streaming_aggregation():
+    weighted_state_dicts = list(zip(state_dicts(4), [1, 5, 3, 2]))
+    streaming_aggregation = aggregation.StreamingAggregation(weighted_state_dicts[0][0])
+    for state_dict, weight in weighted_state_dicts:
+        streaming_aggregation.add(state_dict, weight)
+
+    normalized = [(state_dict, weight/11) for state_dict, weight in weighted_state_dicts]
+    assert_state_dict_close(streaming_aggregation.average(), weighted_sum(normalized))
+
+
+def test_streaming_aggregation_without_state_dicts():
+    streaming_aggregation = aggregation.StreamingAggregation(state_dicts(1)[0])
+
+    with pytest.raises(aggregation.AggregationException):
+        streaming_aggregation.average()
+
+
+def test_buffered_aggregation_of_all_clients_is_fed_avg():
+    global_weights, *clients = state_dicts(5)
+    weights = [1, 5, 3, 2]
+    buffered_aggregation = aggregation.BufferedAggregation(
+        global_weights, len(clients), lambda s: 1.0
+    )
+    for client in range(len(clients)):
+        buffered_aggregation.base_set(client)
+    for client, (state_dict, weight) in enumerate(zip(clients, weights)):
+        assert buffered_aggregation.add(state_dict, client, weight) == 0
+
+    normalized = [(state_dict, weight/11) for state_dict, weight in zip(clients, weights)]
+    assert buffered_aggregation.updates == 1
+    assert_state_dict_close(buffered_aggregation.state_dict(), weighted_sum(normalized))
+
+
+def test_buffered_aggregation_scales_stale_updates():
+    global_weights, *clients = state_dicts(4)
+    weights = [1, 5, 3]
+    staleness = lambda s: (1 + s)**-0.5
+    learning_rate = 0.5
+    buffered_aggregation = aggregation.BufferedAggregation(
+        global_weights, 2, staleness, learning_rate
+    )
+    for client in range(len(clients)):
+        buffered_aggregation.base_set(client)
+    for client in range(2):
+        assert buffered_aggregation.add(clients[client], client, weights[client]) == 0
+    first = buffered_aggregation.state_dict()
+    # trained from the weights before the first update
+    assert buffered_aggregation.add(clients[2], 2, weights[2]) == 1
+    assert buffered_aggregation.flush()
+
+    def update(base, client_updates):
+        expected = collections.OrderedDict()
+        for key, tensor in base.items():
+            if tensor.is_floating_point():
+                delta = sum(
+                    scale*weight*(state_dict[key] - global_weights[key])
+                    for state_dict, weight, scale in client_updates
+                )
+                total = sum(weight for _, weight, _ in client_updates)
+                tensor = tensor + learning_rate*delta/total
+            else:
+                tensor = client_updates[-1][0][key]
+            expected[key] = tensor
+        return expected
+
+    expected_first = update(
+        global_weights, [(clients[0], weights[0], 1.0), (clients[1], weights[1], 1.0)]
+    )
+    expected_second = update(expected_first, [(clients[2], weights[2], staleness(1))])
+
+    assert buffered_aggregation.updates == 2
+    assert_state_dict_close(buffered_aggregation.state_dict(), expected_second)
+    # the weights of a version are not modified by the later updates
+    assert_state_dict_close(first, expected_first)
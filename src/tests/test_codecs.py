@@ -0,0 +1,84 @@
+import pytest
+import torch
+
+from distributed_learning import codecs
+
+
+def gradients() -> torch.Tensor:
+    return torch.randn((16, 8, 20), generator=torch.Generator().manual_seed(0))
+
+
+@pytest.mark.parametrize("spec, tolerance", [
+    ("identity", 0), ("fp16", 1e-3), ("bf16", 1e-2),
+])
+def test_cast_round_trip(spec, tolerance):
+    codec = codecs.codec_create(spec)
+    tensor = gradients()
+
+    decoded = codec.decode(codec.encode(tensor))
+
+    assert decoded.dtype == tensor.dtype
+    assert decoded.shape == tensor.shape
+    torch.testing.assert_close(decoded, tensor, rtol=tolerance, atol=tolerance)
+
+
+def test_int8_round_trip_within_half_a_level():
+    codec = codecs.codec_create("int8")
+    tensor = gradients()
+
+    decoded = codec.decode(codec.encode(tensor))
+
+    scale = (tensor.max() - tensor.min())/255
+    assert decoded.shape == tensor.shape
+    assert (decoded - tensor).abs().max() <= scale/2 + 1e-6
+
+
+def test_int8_constant_and_empty_tensors():
+    codec = codecs.codec_create("int8")
+    constant = torch.full((4, 3), 2.5)
+    empty = torch.empty((0, 3))
+
+    torch.testing.assert_close(codec.decode(codec.encode(constant)), constant)
+    assert codec.decode(codec.encode(empty)).shape == empty.shape
+
+
+def test_topk_sends_the_largest_entries():
+    codec = codecs.codec_create("topk:0.1")
+    tensor = gradients()
+
+    decoded = codec.decode(codec.encode(tensor))
+
+    k = int(0.1*tensor.numel())
+    sent = decoded != 0
+    assert int(sent.sum()) == k
+    torch.testing.assert_close(decoded[sent], tensor[sent])
+    assert tensor[~sent].abs().max() <= tensor[sent].abs().min()
+
+
+def test_topk_without_key_carries_nothing_over():
+    codec = codecs.codec_create("topk:0.1")
+    codec.encode(gradients())
+
+    decoded = codec.decode(codec.encode(torch.zeros((16, 8, 20))))
+
+    assert not decoded.any()
+
+
+def test_topk_error_feedback_per_key():
+    codec = codecs.TopKCodec(0.5, error_feedback=True)
+    tensor = torch.tensor([4.0, -3.0, 2.0, 1.0])
+
+    first = codec.decode(codec.encode(tensor, key="weight"))
+    second = codec.decode(codec.encode(torch.zeros(4), key="weight"))
+    other = codec.decode(codec.encode(torch.zeros(4), key="bias"))
+
+    torch.testing.assert_close(first + second, tensor)
+    assert not other.any()
+
+
+def test_negotiation_keeps_topk_off_the_activations():
+    accepted = codecs.codec_specs_negotiate(
+        {"activations": "topk:0.1", "gradients": "topk:0.1"}
+    )
+
+    assert accepted == {"activations": "identity", "gradients": "topk:0.1"}
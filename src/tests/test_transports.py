@@ -0,0 +1,85 @@
+import os
+import socket
+import threading
+
+import torch
+
+from distributed_learning.transports import ShmCommunicator, ShmRing
+
+
+def ring_pair(size: int):
+    """Producer and consumer ends of the same ring."""
+
+    producer = ShmRing(size=size)
+    return producer, ShmRing(fd=os.dup(producer.fd))
+
+
+def payload(nbytes: int, seed: int) -> bytes:
+    return bytes((seed + i) % 251 for i in range(nbytes))
+
+
+def test_ring_wraps_around_payloads_that_do_not_fit():
+    producer, consumer = ring_pair(1000)
+    try:
+        for seed in range(10):
+            sent = payload(300, seed)
+            producer.write(memoryview(sent))
+            received = bytearray(300)
+            consumer.read_into(memoryview(received))
+            assert received == sent
+        # the payloads at 900 are moved to the start of the ring
+        assert producer.position == consumer.position == 3*1000 + 300
+    finally:
+        producer.close()
+        consumer.close()
+
+
+def test_full_ring_waits_for_the_consumer():
+    producer, consumer = ring_pair(1000)
+    try:
+        sent = [payload(400, seed) for seed in range(3)]
+        producer.write(memoryview(sent[0]))
+        producer.write(memoryview(sent[1]))
+        # the third payload wraps around onto the first, which is not consumed
+        writer = threading.Thread(target=producer.write, args=(memoryview(sent[2]),))
+        writer.start()
+        writer.join(0.2)
+        assert writer.is_alive()
+
+        for i, expected in enumerate(sent):
+            received = bytearray(400)
+            consumer.read_into(memoryview(received))
+            if i == 0:
+                writer.join(5)
+                assert not writer.is_alive()
+            assert received == expected
+    finally:
+        producer.close()
+        consumer.close()
+
+
+def test_communicator_tensors_through_the_rings():
+    ring_size = 1 << 20
+    sock_server, sock_client = socket.socketpair(socket.AF_UNIX)
+    to_server, to_client = ring_pair(ring_size), ring_pair(ring_size)
+    client = ShmCommunicator(sock_client, to_server[0], to_client[1])
+    server = ShmCommunicator(sock_server, to_client[0], to_server[1])
+    try:
+        for i in range(8):
+            # 300 KB tensors, which go through the ring and wrap around it
+            activations = torch.randn((75, 1000))
+            labels = torch.arange(4, dtype=torch.float32)
+            sender = threading.Thread(target=client.send_msg, args=([
+                'MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER', activations, labels
+            ],))
+            sender.start()
+            _, received, received_labels = server.recv_msg(
+                expect_msg_type='MSG_LOCAL_ACTIVATIONS_CLIENT_TO_SERVER'
+            )
+            sender.join()
+            assert torch.equal(received, activations)
+            assert torch.equal(received_labels, labels)
+        assert to_server[0].position > 2*ring_size
+    finally:
+        client.close()
+        server.close()
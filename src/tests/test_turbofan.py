@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.turbofan import downsample_frequency, TurbofanSimulationDataset
+
+
+def fleet_frame(rng: np.random.Generator) -> pd.DataFrame:
+    """Flights of several units with different lengths, with the units and
+    flights out of order."""
+
+    frames = []
+    for unit in [5, 2, 11]:
+        for cycle in rng.permutation(np.arange(1, 6)):
+            nr_samples = int(rng.integers(20, 60))
+            frames.append(pd.DataFrame({
+                "unit": np.full(nr_samples, unit, dtype=np.float64),
+                "cycle": np.full(nr_samples, cycle, dtype=np.float64),
+                "alt": rng.standard_normal(nr_samples),
+                "T24": rng.standard_normal(nr_samples)*100,
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def downsample_frequency_loop(all_data, frequency):
+    """Former implementation of `read_in_data`, one groupby per flight."""
+
+    all_data_shortened = pd.DataFrame(columns = all_data.columns)
+    for unit in np.unique(all_data["unit"]) :
+        data_unit = all_data.loc[all_data["unit"] == unit]
+        for flight in np.unique(data_unit["cycle"]):
+            data_flight = data_unit.loc[data_unit["cycle"] == flight]
+            data_flight.reset_index(inplace = True)
+            means = (
+                data_flight
+                .groupby(np.arange(len(data_flight)) // frequency)
+                .mean()
+            )
+            all_data_shortened = pd.concat([all_data_shortened, means], axis = 0)
+    return all_data_shortened.drop(columns=["index"]).reset_index()
+
+
+@pytest.mark.parametrize("frequency", [1, 3, 10, 100])
+def test_downsample_frequency_matches_loop(frequency):
+    all_data = fleet_frame(np.random.default_rng(0))
+
+    vectorized = downsample_frequency(all_data, frequency)
+    loop = downsample_frequency_loop(all_data, frequency)
+
+    assert list(vectorized.columns) == list(loop.columns)
+    np.testing.assert_allclose(
+        vectorized.to_numpy(dtype=np.float64), loop.to_numpy(dtype=np.float64)
+    )
+
+
+def create_samples_loop(all_data, considered_flights, stepsize_sample, considered_length):
+    """Former `TurbofanSimulationDataset._create_samples`, one filter per
+    flight."""
+
+    sample_index = []
+    unit_flight_sample_indices = {}
+    for unit in np.unique(all_data["unit"]):
+        data_engine = all_data.loc[all_data["unit"] == unit, :]
+        flights = np.unique(data_engine["cycle"])
+        nr_flights = len(flights)
+        for flight in flights:
+            if flight not in considered_flights[unit]:
+                continue
+            data_flight = data_engine.loc[data_engine["cycle"] == flight]
+            nr_samples = data_flight.shape[0]
+            nr_streams = (nr_samples - considered_length)//stepsize_sample + 1
+            for i in range(nr_streams):
+                sample_index.append((
+                    data_flight.index[0]+i*stepsize_sample,
+                    nr_flights - flight,
+                ))
+            unit_flight_sample_indices.setdefault(unit, {})[flight] = [
+                len(sample_index)-nr_streams, len(sample_index)
+            ]
+    return sample_index, unit_flight_sample_indices
+
+
+@pytest.mark.parametrize("stepsize_sample, considered_length", [(1, 20), (3, 10), (7, 15)])
+def test_sample_index_matches_loop(stepsize_sample, considered_length):
+    all_data = fleet_frame(np.random.default_rng(1))
+    considered_flights = {5: [1, 2, 4], 2: [3], 11: [1, 2, 3, 4, 5]}
+
+    dataset = TurbofanSimulationDataset(
+        all_data, stepsize_sample, ["alt", "T24"], considered_length,
+        considered_flights,
+    )
+    sample_index, unit_flight_sample_indices = create_samples_loop(
+        all_data, considered_flights, stepsize_sample, considered_length
+    )
+
+    np.testing.assert_array_equal(dataset.sample_index, np.array(sample_index))
+    assert dataset.unit_flight_sample_indices == unit_flight_sample_indices
@@ -0,0 +1,90 @@
+import collections
+
+import pytest
+import torch
+
+from distributed_learning.communicator import decode_msg, encode_msg
+from distributed_learning.weight_sync import WeightSync, WeightSyncException
+
+
+def state_dict(seed: int) -> collections.OrderedDict:
+    generator = torch.Generator().manual_seed(seed)
+    return collections.OrderedDict([
+        ("conv.weight", torch.randn((8, 4, 3), generator=generator)),
+        ("conv.bias", torch.randn(8, generator=generator)),
+        ("bn.num_batches_tracked", torch.tensor(seed)),
+    ])
+
+
+def wire(msg_type, items):
+    """Items of the message as the peer receives them."""
+
+    return decode_msg(encode_msg([msg_type, *items]))[1:]
+
+
+def global_send(server: WeightSync, client: WeightSync, weights, version):
+    items = server.encode_global(weights, version)
+    return client.decode_global(
+        wire('MSG_INITIAL_GLOBAL_WEIGHTS_SERVER_TO_CLIENT', items)
+    ), items[0]
+
+
+def local_send(server: WeightSync, client: WeightSync, weights):
+    items = client.encode_local(weights)
+    return server.decode_local(
+        wire('MSG_LOCAL_WEIGHTS_CLIENT_TO_SERVER', items)
+    ), items[0]
+
+
+def assert_state_dict_equal(state_dict, other, **tolerances):
+    assert list(state_dict) == list(other)
+    for key in state_dict:
+        torch.testing.assert_close(state_dict[key], other[key], **tolerances)
+
+
+@pytest.mark.parametrize("spec", ["full", "delta"])
+def test_round_trip(spec):
+    server, client = WeightSync(spec), WeightSync(spec)
+
+    for version in range(1, 4):
+        weights = state_dict(2*version)
+        received, header = global_send(server, client, weights, version)
+        assert_state_dict_equal(received, weights)
+        # a delta once the client has acknowledged the previous version
+        if (spec == "delta") and (version > 1):
+            assert header["base"] == version - 1
+        else:
+            assert header["base"] == None
+
+        weights = state_dict(2*version + 1)
+        received, header = local_send(server, client, weights)
+        assert_state_dict_equal(received, weights)
+        assert header["version"] == server.acknowledged_version == version
+        assert header["base"] == (version if spec == "delta" else None)
+
+
+def test_quantized_deltas_keep_the_references_in_step():
+    server, client = WeightSync("delta:int8"), WeightSync("delta:int8")
+
+    for version in range(1, 4):
+        weights = state_dict(version)
+        received, _ = global_send(server, client, weights, version)
+        assert_state_dict_equal(received, weights, rtol=0, atol=0.05)
+        # the server keeps what the client reconstructed, not the weights
+        assert_state_dict_equal(server.reference, client.reference, rtol=0, atol=0)
+        local_send(server, client, received)
+
+
+def test_delta_against_another_reference_is_rejected():
+    server, client = WeightSync("delta"), WeightSync("delta")
+    global_send(server, client, state_dict(0), 1)
+    local_send(server, client, state_dict(1))
+    items = server.encode_global(state_dict(2), 2)
+
+    with pytest.raises(WeightSyncException):
+        WeightSync("delta").decode_global(items)
+
+
+def test_unsupported_spec():
+    with pytest.raises(WeightSyncException):
+        WeightSync("delta:topk")